@@ -0,0 +1,249 @@
+# coding=utf-8
+
+'''
+Benchmark for the importer.
+
+Generates a synthetic metadata.csv with the same 30 columns as input/metadata.csv.sample,
+runs metadata_import.py on it end to end in a scratch folder (so the real input and output
+folders are left alone) and appends records/sec, peak memory and output bytes to a json
+lines file, keyed by git commit so runs on different commits can be compared. The csv is
+generated from a fixed seed, so the same size is always the same data. Publishing can be
+measured by sending the records to a local stub of the GeoNetwork records API.
+'''
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import shutil
+import getopt
+import datetime
+import tempfile
+import subprocess
+
+import validation
+
+SIZES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+
+RESULTS = 'benchmark.jsonl'
+
+SEED = 19139
+
+TEMPLATE = 'dataset_empty.xml'
+
+# values are drawn from the vocabularies the rows are checked against, so none of the rows are rejected
+TOPICS = sorted(validation.TOPIC_CATEGORIES)
+
+UPDATE_FREQUENCIES = sorted(validation.UPDATE_FREQUENCIES)
+
+INSPIRE_THEMES = sorted(validation.INSPIRE_THEMES)
+
+FORMATS = [('ESRI Shapefile', 'unknown'), ('GML', '3.2.1'), ('KML', '2.2'), ('Mapinfo TAB', 'unknown'),
+           ('GeoTIFF', '1.0'), ('PDF', 'unknown')]
+
+WORDS = ['Topography', 'Buildings', 'Roads', 'Rivers', 'Flood risk', 'Planning', 'Trees', 'Parks', 'Schools',
+         'Wards', 'Parishes', 'Footpaths', 'Car parks', 'Conservation areas', 'Listed buildings', 'Bus stops']
+
+
+def generateCsv(path, rows, seed=SEED):
+    # list columns get between one and several items, and about a fifth of the text has characters that need escaping
+    generator = random.Random(seed)
+    with open(path, 'w', newline='') as csvfile:
+        with open('../input/metadata.csv.sample', newline='') as sample:
+            header = next(csv.reader(sample))
+        writer = csv.writer(csvfile, dialect='excel')
+        writer.writerow(header)
+        for row in range(rows):
+            writer.writerow(generateRow(generator, row))
+
+
+def generateRow(generator, row):
+    special = ' & <"quoted">' if generator.random() < 0.2 else ''
+    created = datetime.date(2010, 1, 1) + datetime.timedelta(days=generator.randrange(3650))
+    revised = created + datetime.timedelta(days=generator.randrange(365))
+    formats = generator.sample(FORMATS, generator.randint(1, 4))
+    west, south = generator.uniform(-6, 1), generator.uniform(50, 57)
+    temporalExtent = created.isoformat()
+    if generator.random() < 0.5:
+        temporalExtent += ',' + revised.isoformat()
+
+    return [
+        'Layer %d%s' % (row, special),
+        'Alternative title %d' % row,
+        created.isoformat() if generator.random() < 0.7 else created.strftime('%d/%m/%Y'),
+        revised.isoformat(),
+        'Synthetic abstract for layer %d%s, which is at least 100 characters long to satisfy the Gemini 2.3 requirements' % (row, special),
+        'GIS Team',
+        'gis@council.gov.uk',
+        'The Coach House, 17 West Street, Epsom, Surrey, KY18 7RL',
+        'Council %d' % generator.randrange(50),
+        'GIS Officer',
+        ','.join(generator.sample(WORDS, generator.randint(1, 8))),
+        'Use according to licence',
+        'https://www.ordnancesurvey.co.uk/business-and-government/public-sector/mapping-agreements/inspire-licence.html',
+        'Copyright Council %d' % created.year,
+        ','.join(generator.sample(TOPICS, generator.randint(1, 3))),
+        '%.3f' % west,
+        '%.3f' % (west + generator.uniform(0.01, 2)),
+        '%.3f' % (south + generator.uniform(0.01, 2)),
+        '%.3f' % south,
+        'GB-ENG',
+        temporalExtent,
+        ','.join(dataFormat for dataFormat, version in formats),
+        ','.join(version for dataFormat, version in formats),
+        'OGC:WFS',
+        'http://example.com/layers/%d' % row,
+        'dataset',
+        'Derived from OS Mastermap',
+        generator.choice(UPDATE_FREQUENCIES),
+        ','.join(generator.sample(INSPIRE_THEMES, generator.randint(1, 3))),
+        str(generator.choice([1250, 2500, 10000, 50000])),
+    ]
+
+
+def gitCommit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(dirty)
+
+
+def runImport(rows, importArgs, stub=None):
+    # the importer expects ../input/metadata.csv, ../output and the template in the working folder
+    scratch = tempfile.mkdtemp(prefix='metadata_benchmark_')
+    try:
+        for folder in ('input', 'output', 'python'):
+            os.mkdir(os.path.join(scratch, folder))
+        workdir = os.path.join(scratch, 'python')
+        shutil.copy(TEMPLATE, workdir)
+        print ("Generating %d rows" % rows)
+        generateCsv(os.path.join(scratch, 'input', 'metadata.csv'), rows)
+
+        print ("Importing %d rows with %s" % (rows, ' '.join(importArgs) or 'the default options'))
+        if stub is not None:
+            importArgs = importArgs + ['-o', 'geonetwork', '--url', stub.url]
+        script = os.path.abspath('metadata_import.py')
+        started = time.perf_counter()
+        process = subprocess.run([sys.executable, script, '-a', '-q', '--report', 'report.json'] + importArgs,
+                                 cwd=workdir, capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+        # the stub's errors make the import exit with 1, as some records weren't published
+        if process.returncode not in ((0, 1) if stub is not None else (0,)) or not os.path.exists(os.path.join(workdir, 'report.json')):
+            raise RuntimeError("The import failed:\n" + process.stdout + process.stderr)
+
+        with open(os.path.join(workdir, 'report.json')) as reportfile:
+            report = json.load(reportfile)
+        outputFolder = os.path.join(scratch, 'output')
+        diskBytes = sum(os.path.getsize(os.path.join(outputFolder, file)) for file in os.listdir(outputFolder))
+    finally:
+        shutil.rmtree(scratch)
+
+    result = {
+        'records': report['records'],
+        'failed': report['failed'],
+        'seconds': report['seconds'],
+        # includes starting the interpreter and loading the template
+        'wallSeconds': round(elapsed, 3),
+        'recordsPerSecond': round(report['records'] / report['seconds'], 1) if report['seconds'] else None,
+        'peakRssKb': report['peakRssKb'],
+        'outputBytes': report['outputBytes'],
+        'diskBytes': diskBytes,
+        'stages': report['stages'],
+        'blockCache': report['blockCache'],
+    }
+    if stub is not None:
+        result['published'] = stub.records
+        result['requests'] = stub.requests
+    return result
+
+
+def previousResult(results, rows, importArgs, publishing):
+    # the last result for the same size and options, to compare against
+    if not os.path.exists(results):
+        return None
+    previous = None
+    with open(results) as resultsfile:
+        for line in resultsfile:
+            result = json.loads(line)
+            if result['rows'] == rows and result['args'] == importArgs and result.get('publishing') == publishing:
+                previous = result
+    return previous
+
+
+def getArguments(argv):
+    options = {'sizes': ['1k', '100k'], 'results': RESULTS, 'geonetwork': False, 'latency': 0, 'errors': 0.0}
+    opts, args = getopt.getopt(argv, "hs:r:g", ["help", "sizes=", "results=", "geonetwork", "latency=", "errors="])
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            print ("usage: benchmark.py [-h | --help] [-s SIZES | --sizes SIZES] [-r FILE | --results FILE] [-g | --geonetwork] [--latency MS] [--errors RATE] [-- IMPORT OPTIONS]\n")
+            print ("optional arguments: \n",
+                   "-h, --help \t\t\t show this help message and exit\n",
+                   "-s SIZES, --sizes SIZES \t comma-separated sizes of csv to generate, from %s (default 1k,100k)\n" % ', '.join(SIZES),
+                   "-r FILE, --results FILE \t the json lines file the results are added to (default %s)\n" % RESULTS,
+                   "-g, --geonetwork \t\t publish the records to a local stub of the GeoNetwork records API\n",
+                   "--latency MS \t\t\t how long the stub takes to answer each request (default 0)\n",
+                   "--errors RATE \t\t\t the share of requests the stub fails with a 503, e.g. 0.05 (default 0)\n",
+                   "anything after -- is passed on to metadata_import.py, e.g. -- -b fragments -w 4")
+            sys.exit()
+
+        elif opt in ("-s", "--sizes"):
+            sizes = arg.split(',')
+            for size in sizes:
+                if size not in SIZES:
+                    print (f'The size ({size}) must be one of: {", ".join(SIZES)}')
+                    sys.exit(2)
+            options['sizes'] = sizes
+
+        elif opt in ("-r", "--results"):
+            options['results'] = arg
+
+        elif opt in ("-g", "--geonetwork"):
+            options['geonetwork'] = True
+
+        elif opt == "--latency":
+            options['latency'] = int(arg)
+
+        elif opt == "--errors":
+            options['errors'] = float(arg)
+
+    options['importArgs'] = args
+    return options
+
+
+if __name__ == "__main__":
+
+    options = getArguments(sys.argv[1:])
+    commit, dirty = gitCommit()
+    publishing = None
+    if options['geonetwork']:
+        publishing = {'latency': options['latency'], 'errors': options['errors']}
+
+    for size in options['sizes']:
+        rows = SIZES[size]
+        previous = previousResult(options['results'], rows, options['importArgs'], publishing)
+        result = {'commit': commit, 'dirty': dirty, 'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                  'rows': rows, 'args': options['importArgs'], 'publishing': publishing}
+        stub = None
+        if publishing is not None:
+            from geonetwork_stub import StubServer
+            stub = StubServer(latency=options['latency'] / 1000, errorRate=options['errors']).start()
+        try:
+            result.update(runImport(rows, options['importArgs'], stub))
+        finally:
+            if stub is not None:
+                stub.stop()
+
+        with open(options['results'], 'a') as resultsfile:
+            resultsfile.write(json.dumps(result) + '\n')
+
+        print ("%(rows)d rows: %(recordsPerSecond)s records/sec, %(outputBytes)d output bytes, peak memory %(peakRssKb)s kB" % result)
+        if stub is not None:
+            print ("  %(published)d records published in %(requests)d requests" % result)
+        if result['blockCache']['hitRate'] is not None:
+            print ("  %(hits)d cached blocks reused, %(misses)d rendered (hit rate %(hitRate)s)" % result['blockCache'])
+        if previous is not None:
+            print ("  previously %(recordsPerSecond)s records/sec on %(commit)s" % previous)
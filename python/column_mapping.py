@@ -0,0 +1,171 @@
+# coding=utf-8
+
+'''
+Mapping the columns of differently laid out csv files and workbooks onto the fields of a record.
+
+A mapping file is a json object from field name to the header of the column it is read
+from, or to a rule that also says how the value is split, stripped or transformed. When a
+file is opened, the mapping is compiled against its header into a fixed projection plan:
+the index of each column is looked up once, the columns that are only copied are picked
+out of each row together with a single itemgetter, and only the fields with rules run any
+code of their own. Each row comes out in the layout of the sample csv, so the rest of the
+import doesn't need to know about the mapping.
+'''
+
+import json
+import operator
+import functools
+
+# the fields of a record, in the order of the columns of the sample csv
+FIELDS = [
+    'title', 'altTitle', 'creationDate', 'revisionDate', 'abstract',
+    'contactName', 'contactEmail', 'contactAddress', 'contactOrg', 'contactPosition',
+    'keywords', 'useLimitation', 'licence', 'copyright', 'topics',
+    'west', 'east', 'north', 'south', 'extent', 'temporalExtent',
+    'distributionFormats', 'distributionVersions', 'transferProtocol', 'transferURL',
+    'dataQuality', 'lineage', 'updateFrequency', 'inspireKeywords', 'denominator', 'crs',
+]
+
+TRANSFORMS = {'lower': str.lower, 'upper': str.upper}
+
+RULE_KEYS = ('column', 'split', 'strip', 'transform', 'default')
+
+
+class MappingError(ValueError):
+    pass
+
+
+class ShortRow(list):
+    # a row with fewer columns than the mapping reads from, passed on as it is so that it's rejected when it's checked
+
+    def __init__(self, row, needed):
+        super().__init__(row)
+        self.needed = needed
+
+
+@functools.lru_cache(maxsize=None)
+def loadMapping(path):
+    # reads and checks a mapping file, returns {field: rule} with every key of each rule filled in
+    try:
+        with open(path) as mappingfile:
+            fields = json.load(mappingfile)
+    except (OSError, ValueError) as e:
+        raise MappingError("The mapping file %s can't be read: %s" % (path, e))
+    if not isinstance(fields, dict):
+        raise MappingError("The mapping file %s should be a json object of field names" % path)
+
+    mapping = {}
+    for field, rule in fields.items():
+        if field not in FIELDS:
+            raise MappingError("The mapping file %s has an unknown field %r, the fields are: %s" % (path, field, ', '.join(FIELDS)))
+        if not isinstance(rule, dict):
+            rule = {'column': rule}
+        unknown = set(rule) - set(RULE_KEYS)
+        if unknown:
+            raise MappingError("The mapping for %s has unknown settings: %s" % (field, ', '.join(sorted(unknown))))
+        if rule.get('transform') not in (None, *TRANSFORMS):
+            raise MappingError("The transform for %s must be one of: %s" % (field, ', '.join(TRANSFORMS)))
+        columns = rule.get('column')
+        if columns is None:
+            columns = []
+        elif not isinstance(columns, list):
+            columns = [columns]
+        if not all(isinstance(column, (str, int)) for column in columns):
+            raise MappingError("The column for %s must be a header, a column number or a list of them" % field)
+        mapping[field] = {'columns': columns, 'split': rule.get('split'), 'strip': bool(rule.get('strip')),
+                          'transform': rule.get('transform'), 'default': rule.get('default', '')}
+
+    if not mapping.get('title', {}).get('columns'):
+        raise MappingError("The mapping file %s doesn't say which column has the title" % path)
+    return mapping
+
+
+def headerName(name):
+    # headers are matched ignoring case and line breaks, which workbook headers often have
+    return ' '.join(str(name).split()).lower()
+
+
+def columnIndex(column, positions, field, path):
+    if isinstance(column, int):
+        return column
+    index = positions.get(headerName(column))
+    if index is None:
+        raise MappingError("The column %r for %s isn't in the header of %s" % (column, field, path))
+    return index
+
+
+def fieldValue(columns, rule):
+    # the function that works out the value of a field with a rule, its settings are looked up once here rather than for every row
+    split, strip, transform, default = rule['split'], rule['strip'], TRANSFORMS.get(rule['transform']), rule['default']
+
+    def value(row):
+        items = [row[index] for index in columns]
+        if split:
+            items = [part for item in items for part in item.split(split)]
+        if strip:
+            items = [item.strip() for item in items]
+        if transform is not None:
+            items = [transform(item) for item in items]
+        # several columns, or a list split on another separator, become the comma-separated list the import expects
+        return ','.join(item for item in items if item) or default
+
+    return value
+
+
+class ProjectionPlan:
+
+    def __init__(self, indexes, computed, needed):
+        # indexes has the column copied for each field, computed the (position, function) of the fields with rules
+        self.pick = operator.itemgetter(*indexes)
+        self.computed = computed
+        self.needed = needed
+
+    def project(self, row):
+        if len(row) < self.needed:
+            return ShortRow(row, self.needed)
+        values = list(self.pick(row))
+        for position, value in self.computed:
+            values[position] = value(row)
+        return values
+
+
+def compilePlan(mapping, header, path):
+    positions = {}
+    for index, name in enumerate(header):
+        positions.setdefault(headerName(name), index)
+
+    indexes = []
+    computed = []
+    needed = 0
+    for position, field in enumerate(FIELDS):
+        rule = mapping.get(field)
+        columns = [columnIndex(column, positions, field, path) for column in rule['columns']] if rule else []
+        needed = max([needed] + [index + 1 for index in columns])
+        if rule is None or not columns:
+            # a field that isn't mapped gets its default, the column picked for it is replaced
+            default = rule['default'] if rule else ''
+            indexes.append(0)
+            computed.append((position, lambda row, default=default: default))
+        elif len(columns) == 1 and not (rule['split'] or rule['strip'] or rule['transform'] or rule['default']):
+            indexes.append(columns[0])
+        else:
+            indexes.append(columns[0])
+            computed.append((position, fieldValue(columns, rule)))
+    return ProjectionPlan(indexes, computed, needed)
+
+
+def keyColumn(key, mapping=None):
+    # the position, in the projected rows, of the column that identifies each row in an incremental import
+    # the key can be a field name, a header in the mapping or the number of a column in the layout of the sample csv
+    if key is None:
+        return key
+    if isinstance(key, int) or key.isnumeric():
+        if int(key) >= len(FIELDS):
+            raise MappingError("The key column (%s) must be one of the %d columns, counting from 0" % (key, len(FIELDS)))
+        return int(key)
+    if key in FIELDS:
+        return FIELDS.index(key)
+    for field, rule in (mapping or {}).items():
+        if any(isinstance(column, str) and headerName(column) == headerName(key) for column in rule['columns']):
+            return FIELDS.index(field)
+    raise MappingError("The key column (%s) must be a column number, a field name or a header in the mapping" % key)
@@ -0,0 +1,96 @@
+# coding=utf-8
+
+'''
+Normalisation of the creation, revision and temporal extent dates to YYYY-MM-DD.
+
+The same few dates tend to be repeated across thousands of rows, so parsed values are
+kept in a bounded LRU cache, and the two documented forms (YYYY-MM-DD and DD/MM/YYYY)
+are handled without arrow. Anything else is given to arrow as a last resort.
+'''
+
+import re
+import datetime
+import functools
+
+# number of distinct raw date strings kept in the cache
+DATE_CACHE_SIZE = 4096
+
+ISO_DATE = re.compile(r'(\d{4})-(\d{2})-(\d{2})$')
+UK_DATE = re.compile(r'(\d{2})/(\d{2})/(\d{4})$')
+
+# a year or a year and month on its own is a valid gml time position
+PARTIAL_ISO_DATE = re.compile(r'\d{4}(-(0[1-9]|1[0-2]))?$')
+
+# formats tried with arrow when the fast paths don't match
+FALLBACK_FORMATS = ['D/M/YYYY', 'YYYY-M-D']
+
+
+class DateFormatError(ValueError):
+
+    def __init__(self, field, value):
+        if value:
+            message = "%s %r is not a valid date, dates must be of the form YYYY-MM-DD or DD/MM/YYYY" % (field, value)
+        else:
+            message = "%s is missing" % field
+        super().__init__(message)
+        self.field = field
+        self.value = value
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def parseDate(value):
+    # returns the date as YYYY-MM-DD, or None if it isn't a valid date
+    match = ISO_DATE.match(value)
+    if match:
+        return value if isValid(*match.groups()) else None
+
+    match = UK_DATE.match(value)
+    if match:
+        day, month, year = match.groups()
+        return '%s-%s-%s' % (year, month, day) if isValid(year, month, day) else None
+
+    import arrow
+    for dateFormat in FALLBACK_FORMATS:
+        try:
+            return arrow.get(value, dateFormat).format('YYYY-MM-DD')
+        except (arrow.parser.ParserError, ValueError):
+            pass
+    return None
+
+
+def isValid(year, month, day):
+    try:
+        datetime.date(int(year), int(month), int(day))
+        return True
+    except ValueError:
+        return False
+
+
+def normaliseDate(value, field, required=True, allowPartial=False):
+    value = value.strip()
+    if not value:
+        if required:
+            raise DateFormatError(field, value)
+        return ''
+    if allowPartial and PARTIAL_ISO_DATE.match(value):
+        return value
+    normalised = parseDate(value)
+    if normalised is None:
+        raise DateFormatError(field, value)
+    return normalised
+
+
+def normaliseDates(values, field, required=True, allowPartial=False):
+    # normalises a whole column at once, parsing each distinct value only once
+    # returns the dates in the same order, with a DateFormatError in place of each malformed one
+    normalised = {}
+    for value in set(values):
+        try:
+            normalised[value] = normaliseDate(value, field, required, allowPartial)
+        except DateFormatError as e:
+            normalised[value] = e
+    return [normalised[value] for value in values]
+
+
+def cacheInfo():
+    return parseDate.cache_info()
@@ -0,0 +1,116 @@
+# coding=utf-8
+
+'''
+A stand-in for the GeoNetwork records API, for testing and benchmarking publishing.
+
+It hands out an XSRF token, accepts records uploaded one at a time (PUT) or as a MEF
+archive (POST), and counts them without keeping them. It can be made slow, or made to
+fail a share of the requests with a 503 so the retries are exercised.
+'''
+
+import io
+import sys
+import json
+import time
+import random
+import getopt
+import zipfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from publisher import RECORDS_API
+
+TOKEN = 'stub-xsrf-token'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.reply(200, {}, cookie=True)
+
+    def do_PUT(self):
+        self.receive(lambda body: 1)
+
+    def do_POST(self):
+        self.receive(lambda body: len([name for name in zipfile.ZipFile(io.BytesIO(body)).namelist()
+                                       if name.endswith('/metadata/metadata.xml')]))
+
+    def receive(self, countRecords):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        if not self.path.startswith(server.prefix + RECORDS_API):
+            return self.reply(404, {'message': 'not found'})
+        if self.headers.get('X-XSRF-TOKEN') != TOKEN:
+            return self.reply(403, {'message': 'missing XSRF token'})
+        time.sleep(server.latency)
+        if server.random.random() < server.errorRate:
+            return self.reply(503, {'message': 'try again'})
+
+        if self.command == 'POST':
+            # the record is the one part of a multipart upload we care about, find the zip inside it
+            body = body[body.index(b'PK\x03\x04'):]
+        records = countRecords(body)
+        with server.lock:
+            server.records += records
+            server.requests += 1
+        self.reply(201, {'errors': [], 'numberOfRecordsProcessed': records})
+
+    def reply(self, status, content, cookie=False):
+        data = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if cookie:
+            self.send_header('Set-Cookie', 'XSRF-TOKEN=%s; Path=/' % TOKEN)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, errorRate=0.0, prefix='/geonetwork'):
+        super().__init__(('127.0.0.1', port), StubHandler)
+        self.prefix = prefix
+        self.latency = latency
+        self.errorRate = errorRate
+        self.random = random.Random(0)
+        self.lock = threading.Lock()
+        self.records = 0
+        self.requests = 0
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d%s' % (self.server_address[1], self.prefix)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='geonetwork-stub', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+
+    port, latency, errorRate = 8080, 0.0, 0.0
+    opts, args = getopt.getopt(sys.argv[1:], "p:l:e:", ["port=", "latency=", "errors="])
+    for opt, arg in opts:
+        if opt in ("-p", "--port"):
+            port = int(arg)
+        elif opt in ("-l", "--latency"):
+            latency = float(arg) / 1000
+        elif opt in ("-e", "--errors"):
+            errorRate = float(arg)
+
+    server = StubServer(port, latency, errorRate)
+    print ("Stub GeoNetwork listening on %s" % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print ("%d records received in %d requests" % (server.records, server.requests))
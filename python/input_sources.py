@@ -0,0 +1,222 @@
+# coding=utf-8
+
+'''
+The files the rows are read from.
+
+The input can be a csv file, an Excel workbook, or a folder or glob pattern matching any
+number of both. Each file is read as its own stream, one row at a time: workbooks are
+opened in openpyxl's read-only mode, which parses the sheet as it goes rather than
+loading it, so memory use doesn't grow with the size or number of the files. Parsing a
+workbook is slow, so when there are several files and several workers, each file is read
+by its own process, a few files ahead of the one being imported, and its rows are handed
+back in bounded chunks in file order. For an import that can be resumed, the files are
+read in this process along with the position after each row, the byte offset in a csv
+file, so an interrupted import can seek straight back to where it was.
+'''
+
+import os
+import csv
+import glob
+import locale
+import datetime
+import itertools
+import collections
+
+from column_mapping import MappingError, compilePlan
+
+DEFAULT_INPUT = '../input/metadata.csv'
+
+INPUT_EXTENSIONS = ('.csv', '.xlsx')
+
+# rows sent back from a reader process at a time, and chunks each reader can get ahead by
+READ_CHUNK_SIZE = 100
+READ_AHEAD_CHUNKS = 8
+
+# the sheet the rows are read from, if a workbook has one with this name, otherwise the first sheet
+SHEET_NAME = 'metadata'
+
+
+def expandInputs(spec):
+    # the input files for a file name, folder or glob pattern, in name order
+    if os.path.isdir(spec):
+        paths = [os.path.join(spec, name) for name in os.listdir(spec)]
+    elif glob.has_magic(spec):
+        paths = glob.glob(spec)
+    else:
+        return [spec]
+    # Excel leaves ~$ lock files next to open workbooks
+    return sorted(path for path in paths if path.lower().endswith(INPUT_EXTENSIONS)
+                  and not os.path.basename(path).startswith('~$') and os.path.isfile(path))
+
+
+def readInput(path):
+    # yields every row of the file, starting with the header, as a list of strings
+    if path.lower().endswith('.xlsx'):
+        return readWorkbook(path)
+    return readCsv(path)
+
+
+def dataRows(path, mapping=None):
+    # the rows of the file after the header, projected onto the layout of the sample csv if there is a column mapping
+    rows = readInput(path)
+    try:
+        header = next(rows, None)
+        if mapping is None:
+            yield from rows
+        else:
+            yield from map(compilePlan(mapping, header or [], path).project, rows)
+    finally:
+        # a workbook is closed as soon as it has been read, rather than whenever it is garbage collected
+        rows.close()
+
+
+def readInputs(inputs, readers=1, mapping=None):
+    # yields the data rows of each input file in turn
+    if readers == 1 or len(inputs) == 1:
+        for path in inputs:
+            yield from dataRows(path, mapping)
+        return
+
+    import multiprocessing
+    files = iter(inputs)
+    pending = collections.deque()
+
+    def startReader(path):
+        queue = multiprocessing.Queue(READ_AHEAD_CHUNKS)
+        process = multiprocessing.Process(target=readInChunks, args=(path, queue, mapping), name='reader', daemon=True)
+        process.start()
+        pending.append((path, process, queue))
+
+    try:
+        for path in itertools.islice(files, readers):
+            startReader(path)
+        while pending:
+            path, process, queue = pending[0]
+            for chunk in iter(queue.get, None):
+                if isinstance(chunk, MappingError):
+                    raise chunk
+                if isinstance(chunk, str):
+                    raise IOError("Reading %s failed: %s" % (path, chunk))
+                yield from chunk
+            process.join()
+            pending.popleft()
+            for path in itertools.islice(files, 1):
+                startReader(path)
+    finally:
+        # when fewer rows are wanted than there are, the readers still running are stopped
+        for path, process, queue in pending:
+            process.terminate()
+            process.join()
+
+
+def readInChunks(path, queue, mapping=None):
+    # runs in a reader process, a failure is sent back as its message, or as it is if the file doesn't match the mapping
+    try:
+        rows = dataRows(path, mapping)
+        for chunk in iter(lambda: list(itertools.islice(rows, READ_CHUNK_SIZE)), []):
+            queue.put(chunk)
+    except MappingError as e:
+        queue.put(e)
+    except Exception as e:
+        queue.put(str(e))
+    queue.put(None)
+
+
+def positionedRows(inputs, mapping=None, start=(0, 0)):
+    # yields (data row, position after it) for the files from the position, which is the index of the file and
+    # the byte offset of the next row in a csv file, or the number of data rows read from a workbook
+    first, resume = start
+    for index in range(first, len(inputs)):
+        path = inputs[index]
+        offset = resume if index == first else 0
+        if path.lower().endswith('.xlsx'):
+            # a workbook can't be read from the middle, so the rows already done are read again and skipped
+            rows = ((row, count) for count, row in enumerate(readWorkbook(path)))
+        else:
+            rows = readCsvFrom(path, offset)
+        try:
+            header, position = next(rows, ([], 0))
+            project = compilePlan(mapping, header, path).project if mapping is not None else None
+            remaining = itertools.islice(rows, offset, None) if path.lower().endswith('.xlsx') else rows
+            for row, position in remaining:
+                yield (row if project is None else project(row)), (index, position)
+        finally:
+            rows.close()
+
+
+class OffsetLines:
+    # the decoded lines of a file opened in binary, keeping the byte offset of the end of the last line read
+
+    def __init__(self, file):
+        self.file = file
+        self.offset = 0
+        # the encoding open() uses for the csv otherwise
+        self.encoding = locale.getpreferredencoding(False)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.file.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        line = line.decode(self.encoding)
+        # line endings are translated as they are when the file is read as text
+        return line[:-2] + '\n' if line.endswith('\r\n') else line
+
+    def seek(self, offset):
+        self.file.seek(offset)
+        self.offset = offset
+
+
+def readCsvFrom(path, offset=0):
+    # yields (row, byte offset after it) for the header and then the rows from the offset
+    # the csv reader only takes as many lines as the row it is reading needs, so the offset is exact
+    with open(path, 'rb') as csvfile:
+        lines = OffsetLines(csvfile)
+        rows = csv.reader(lines, dialect='excel')
+        for header in itertools.islice(rows, 1):
+            yield header, lines.offset
+            if offset:
+                lines.seek(offset)
+            for row in rows:
+                yield row, lines.offset
+
+
+def readCsv(path):
+    with open(path, 'r') as csvfile:
+        yield from csv.reader(csvfile, dialect='excel')
+
+
+def readWorkbook(path):
+    import openpyxl
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[SHEET_NAME] if SHEET_NAME in workbook.sheetnames else workbook.worksheets[0]
+        width = None
+        for cells in sheet.iter_rows(values_only=True):
+            row = [cellText(value) for value in cells]
+            # empty cells at the end of a row are left out of the sheet, so rows are padded to the width of the header
+            if width is None:
+                while row and not row[-1]:
+                    row.pop()
+                width = len(row)
+            elif not any(row):
+                continue
+            yield row + [''] * (width - len(row))
+    finally:
+        workbook.close()
+
+
+def cellText(value):
+    # the text the cell would have if the sheet was saved as csv
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
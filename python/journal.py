@@ -0,0 +1,90 @@
+# coding=utf-8
+
+'''
+Resuming an import that was interrupted.
+
+With a journal, the import keeps the position in the input after the last row whose
+record has been written in a small file in the output folder, replacing it atomically
+every few seconds. Record ids are derived from an id for the run and the number of the
+row, so they are as unique as random ones, but a row gets the same ids again when the
+run is resumed. A resumed import seeks straight to the position in the journal, and any
+records written after the last checkpoint are simply written again under the same name.
+'''
+
+import os
+import json
+import time
+import uuid
+import collections
+
+from manifest import stableIds
+from output_writers import replacedFile
+
+JOURNAL = 'journal.json'
+
+# how often the journal is written, at most
+CHECKPOINT_SECONDS = 10
+
+
+class JournalError(ValueError):
+    pass
+
+
+def inputState(inputs):
+    # a resumed import has to read exactly the same files, as the positions are byte offsets
+    return [[path, os.path.getsize(path), os.stat(path).st_mtime_ns] for path in inputs]
+
+
+class Journal:
+
+    def __init__(self, directory, inputs, resume=False):
+        self.path = os.path.join(directory, JOURNAL)
+        self.inputs = inputState(inputs)
+        state = None
+        if resume:
+            try:
+                with open(self.path) as journal:
+                    state = json.load(journal)
+            except OSError:
+                raise JournalError("There is no journal to resume from in %s" % directory)
+            if state['inputs'] != self.inputs:
+                raise JournalError("The input has changed since the journal was written, the import can't be resumed")
+        self.runId = state['runId'] if state else str(uuid.uuid4())
+        # the number of rows done and the position after them
+        self.rows = state['rows'] if state else 0
+        self.position = tuple(state['position']) if state else (0, 0)
+        # (rows, position) at the end of each chunk that has been read but not written yet
+        self.pending = collections.deque()
+        self.saved = time.monotonic()
+
+    def numberedRows(self, rows, chunkSize):
+        # yields (data, ids) for the (data, position) rows, noting the position at the end of each chunk
+        # a chunk's position is noted before its last row is handed on, as the chunk is complete once it has it
+        number = self.rows
+        position = None
+        for data, position in rows:
+            number += 1
+            if (number - self.rows) % chunkSize == 0:
+                self.pending.append((number, position))
+            yield data, stableIds('%s:%d' % (self.runId, number - 1))
+        if position is not None and (number - self.rows) % chunkSize:
+            self.pending.append((number, position))
+
+    def chunkWritten(self):
+        # called as the records of each chunk have been written, in order
+        self.rows, self.position = self.pending.popleft()
+        if time.monotonic() - self.saved >= CHECKPOINT_SECONDS:
+            self.save()
+
+    def save(self):
+        # the records written so far are flushed to disk first, so the journal never points past records a crash could lose
+        if hasattr(os, 'sync'):
+            os.sync()
+        with replacedFile(self.path, sync=True) as journal:
+            json.dump({'runId': self.runId, 'inputs': self.inputs, 'rows': self.rows, 'position': self.position}, journal)
+        self.saved = time.monotonic()
+
+    def finish(self):
+        # a finished import has nothing to resume
+        if os.path.exists(self.path):
+            os.remove(self.path)
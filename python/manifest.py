@@ -0,0 +1,114 @@
+# coding=utf-8
+
+'''
+Incremental imports.
+
+Record ids are derived from a key column (or the whole row) instead of being random, and
+a manifest in the output folder maps each fileId to the hash of the row it was built from
+and the digest of the xml that was written. Rows whose hash hasn't changed since the last
+run are skipped, and records whose rows have disappeared are reported or removed.
+'''
+
+import os
+import json
+import uuid
+import hashlib
+
+from output_writers import recordName, replacedFile
+
+MANIFEST = 'manifest.json'
+
+# namespace for the uuid5 record ids, changing it would give every record a new id
+ID_NAMESPACE = uuid.UUID('8c1e5a1e-4b1f-4c36-9d2a-6f0c2f3b7a41')
+
+
+class DuplicateKey(ValueError):
+
+    field = 'key'
+
+
+class MissingKey(IndexError):
+
+    field = 'key'
+
+
+def stableIds(key):
+    # the fileId and the gml:TimePeriod id for a record, always the same for the same key
+    return str(uuid.uuid5(ID_NAMESPACE, key)), '_' + str(uuid.uuid5(ID_NAMESPACE, 'TimePeriod:' + key))
+
+
+def rowHash(data, templateKey):
+    # the template is part of the hash so every record is rebuilt when the template changes
+    digest = hashlib.sha1(templateKey.encode('utf-8'))
+    digest.update('\x1f'.join(data).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def outputDigest(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class Manifest:
+
+    def __init__(self, directory, templateKey, keyColumn=None, compressed=False):
+        self.path = os.path.join(directory, MANIFEST)
+        self.directory = directory
+        self.compressed = compressed
+        self.templateKey = templateKey
+        self.keyColumn = keyColumn
+        self.records = {}
+        if os.path.exists(self.path):
+            with open(self.path) as manifest:
+                self.records = json.load(manifest)['records']
+        self.seen = set()
+        self.pending = {}
+        self.counts = {'added': 0, 'changed': 0, 'unchanged': 0}
+
+    def changedRows(self, rows):
+        # yields (data, ids) for the rows that are new or have changed since the last run
+        # rows without a key, or with the key of an earlier row, are yielded with the error in place of their ids,
+        # so they are reported along with the other failures of their chunk and error.log keeps the order of the input
+        for data in rows:
+            if self.keyColumn is None:
+                key = '\x1f'.join(data)
+            elif self.keyColumn < len(data):
+                key = data[self.keyColumn]
+            else:
+                yield data, MissingKey("the row has %d columns so it has no key column (%d), the row has been skipped" % (len(data), self.keyColumn))
+                continue
+            ids = stableIds(key)
+            fileId = ids[0]
+            if fileId in self.seen:
+                yield data, DuplicateKey("duplicate key %r, the row has been skipped" % key)
+                continue
+            self.seen.add(fileId)
+
+            hashed = rowHash(data, self.templateKey)
+            previous = self.records.get(fileId)
+            if previous is not None and previous[0] == hashed and os.path.exists(self.recordPath(fileId)):
+                self.counts['unchanged'] += 1
+                continue
+            self.pending[fileId] = hashed
+            yield data, ids
+
+    def recordPath(self, fileId):
+        return os.path.join(self.directory, recordName(fileId, self.compressed))
+
+    def update(self, written):
+        # record the row hash and output digest of each record that has been written
+        for fileId, digest in written:
+            self.counts['changed' if fileId in self.records else 'added'] += 1
+            self.records[fileId] = [self.pending.pop(fileId), digest]
+
+    def finish(self, prune=False):
+        # returns the fileIds of records whose rows are no longer in the csv
+        deleted = sorted(set(self.records) - self.seen)
+        if prune:
+            for fileId in deleted:
+                if os.path.exists(self.recordPath(fileId)):
+                    os.remove(self.recordPath(fileId))
+                del self.records[fileId]
+
+        with replacedFile(self.path) as manifest:
+            json.dump({'records': self.records}, manifest)
+        return deleted
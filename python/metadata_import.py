@@ -10,430 +10,64 @@ import unittest
 from unittest import skip
 import csv
 import uuid
-import xml
 import xml.dom.minidom as minidom
-import owslib
-from owslib.iso import *
-import pyproj
-from pyproj import CRS
-from decimal import *
+from template_plan import loadPlan, planKey, stripWhitespace
+from renderers import RENDERERS, SERIALISATIONS
+from output_writers import OUTPUT_DIRECTORY, OUTPUT_FORMATS, DirectoryWriter, RecordCollector, openOutput
+from manifest import Manifest, outputDigest
+from dates import normaliseDates
+from reprojection import reprojectColumn, checkCrs
+from run_report import PROFILERS, RunStats, timed, profiled, writeReport
+from validation import validateRows, vocabularyMessage
+from schema_validation import SchemaValidationError, loadValidator, clearQuarantine, quarantine
+from input_sources import DEFAULT_INPUT, expandInputs, readInputs, positionedRows
+from journal import Journal, JournalError
+from column_mapping import MappingError, loadMapping, keyColumn
+from publisher import PublishError
 import logging
-import arrow
 import getopt
+import time
+import itertools
+import collections
+# owslib, pyproj, arrow and numpy are only imported by the features that need them, so starting up stays quick
 
-# command-line arguments for the number of rows to be parsed have to be stored in a global variable so they can then be used inside unittest 
-command_line_arg_numrows = None
+# the options an import runs with unless the command line or the caller of importMetadata says otherwise
+DEFAULT_OPTIONS = {'numrows': None, 'workers': 1, 'backend': 'minidom', 'output': 'dir',
+                   'incremental': False, 'key': None, 'prune': False, 'crs': None,
+                   'quiet': False, 'report': None, 'profile': None,
+                   'url': None, 'uploads': 4, 'batch': 1, 'strict': False,
+                   'schema': None, 'schematron': None, 'input': DEFAULT_INPUT, 'mapping': None,
+                   'serialise': 'tabs', 'journal': False, 'resume': False}
 
-class TestMetadataImport(unittest.TestCase):
+# the options of the current import are stored in a global variable so they can be used while the records are built,
+# and handed on to the worker processes
+command_line_options = dict(DEFAULT_OPTIONS)
 
-    def setUp(self):
-        # remove existing output files
-        for file in os.listdir('../output'):
-            if file not in ['.gitignore']:
-                os.remove('../output/' + file)
+# optional column giving the crs of the bounding coordinates
+CRS_COLUMN = 30
 
-        logging.basicConfig(filename='error.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+# number of rows prepared together, and handed to a worker process at a time when running in parallel
+CHUNK_SIZE = 100
 
+TEMPLATE = 'dataset_empty.xml'
 
-    def testMetadataImport(self):
-        raw_data = []
+# renderer for the template, destination for the records and schema validator, set up once in each worker process
+workerRenderer = None
+workerOutput = None
+workerValidator = None
 
-        # check if there is a command-line argument, otherwise request user input
-        if command_line_arg_numrows == None:
-            numrows = (input('Please enter the number of rows you want to be parsed from metadata.csv \nAlternatively, just type in "all", for parsing all the lines\n'))        
-        else:
-            numrows = command_line_arg_numrows
-
-        with open('../input/metadata.csv', 'r') as csvfile:
-
-            # count the number of lines in 'metadata.csv' and reset  the file stream
-            input_linescount = len(csvfile.readlines())
-            csvfile.seek(0, 0)
-
-            if numrows == 'all' or numrows.isnumeric():
-                if numrows != 'all' and int(numrows) < input_linescount:
-                    file = [line.rstrip('\n') for line in csvfile][:int(numrows)+1]
-                    reader = csv.reader(file, dialect='excel')
-                    for columns in reader:
-                        raw_data.append(columns)                        
-                elif numrows == 'all' or int(numrows) > input_linescount:
-                    reader = csv.reader(csvfile, dialect='excel')
-                    for columns in reader:
-                        raw_data.append(columns)
-                    if numrows != 'all' and int(numrows) > input_linescount:
-                        print(f'The number of rows you have entered ({numrows}) was greater than the number of rows in the "metadata.csv" file ({input_linescount}) so all lines have been parsed and exported.')
-            else:
-                print(f'The value you have entered ({numrows}) is not valid, please try again. If you need help using this script try running "metadata_import.py -h"') 
-
-            # columns order:
-            """
-                title = columns[0]
-                alt_title = columns[1]
-                creation_date = columns[2]
-                revsion_date = columns[3]
-                abstract = columns[4]
-                pointofcontact_name = columns[5]
-                pointofcontact_email = columns[6]
-                pointofcontact_address = columns[7]
-                pointofcontact_org = columns[8]
-                pointofcontact_position = columns[9]
-                keyword = columns[10]
-                use_limitation = columns[11]
-                licence_constraints = columns[12]
-                copyright_constraints = columns[13]
-                topic_category = columns[14]
-                west_bc = columns[15]
-                east_bc = columns[16]
-                north_bc = columns[17]
-                south_bc = columns[18]
-                extent = columns[19]
-                temp_extent = columns[20]
-                data_format = columns[21]
-                data_version = columns [22]
-                transfer_protocol = columns[23]
-                transfer_url = columns[24]
-                data_quality = columns[25]
-                lineage = columns[26]
-                update_freq = columns[27]
-                inspire_keyword = columns[28]
-                denominator = columns[29]
-            """
-
-
-        with open('dataset_empty.xml') as gemini:
-            doc = minidom.parseString(gemini.read().encode( "utf-8" ))
-            
-
-        # create metadata from the first csv entry to begin with
-        # data = raw_data[1]
-        for data in raw_data[1:]:
-            try:
-                # create a new record from the template
-                record = doc.cloneNode(doc)
-
-                # pull out the gemini top-level elements
-                fileIdentifier = record.getElementsByTagName('gmd:fileIdentifier')
-                language = record.getElementsByTagName('gmd:language')[0]
-                hierarchyLevel = record.getElementsByTagName('gmd:hierarchyLevel')
-                contact = record.getElementsByTagName('gmd:contact')
-                dateStamp = record.getElementsByTagName('gmd:dateStamp')
-                referenceSystemInfo = record.getElementsByTagName('gmd:referenceSystemInfo')
-                identificationInfo = record.getElementsByTagName('gmd:identificationInfo')
-                distributionInfo = record.getElementsByTagName('gmd:distributionInfo')
-                dataQualityInfo = record.getElementsByTagName('gmd:dataQualityInfo')
-                metadataMaintenance = record.getElementsByTagName('gmd:metadataMaintenance')
-
-                # generate and add the fileId
-                fileId = str(uuid.uuid4())
-                fileIdentifier[0].childNodes[1].appendChild(record.createTextNode(fileId))
-                identifierElement = identificationInfo[0].getElementsByTagName('gmd:code')[0]
-                identifierNode = record.createTextNode(fileId)
-                identifierElement.childNodes[1].appendChild(identifierNode)
-
-                # add the title
-                title = data[0]
-                titleElement = identificationInfo[0].getElementsByTagName('gmd:title')[0]
-                titleNode = record.createTextNode(title)
-                titleElement.childNodes[1].appendChild(titleNode)
-                print ("\nTitle: " + title)
-
-                # add alternative title
-                altTitle = data[1]
-                altTitleElement = identificationInfo[0].getElementsByTagName('gmd:alternateTitle')[0]
-                altTitleNode = record.createTextNode(altTitle)
-                altTitleElement.childNodes[1].appendChild(altTitleNode)
-                print ("Alt Title: " + altTitle)
-
-                # add abstract
-                abstract = data[4]
-                abstractElement = identificationInfo[0].getElementsByTagName('gmd:abstract')[0]
-                abstractNode = record.createTextNode(abstract)
-                abstractElement.childNodes[1].appendChild(abstractNode)
-                print ("Abstract: " + abstract)
-
-                # add topics from comma-separated list
-                topics = data[14].split(',')
-                topicElement = identificationInfo[0].getElementsByTagName('gmd:topicCategory')[0]
-                for i, t in enumerate(topics):
-                    print ("Topic: " + t)
-                    newtopicElement = record.createElement('gmd:MD_TopicCategoryCode')
-                    newtopicNode = record.createTextNode(t.strip())
-                    newtopicElement.appendChild(newtopicNode)
-                    topicElement.appendChild(newtopicElement)
-
-                # add inspire keywords from comma-separated list
-                # strip spaces from beginning or end of each item
-                inspireKeywords = data[28].split(',')
-                if inspireKeywords:
-                    inspireKeywordElement = identificationInfo[0].getElementsByTagName('gmd:MD_Keywords')[0]
-                    for i, k in enumerate(inspireKeywords):
-                        newInspirekeywordElement = record.createElement('gmd:keyword')
-                        newInspirekeywordStringElement = record.createElement('gco:CharacterString')
-                        newInspirekeywordNode = record.createTextNode(k.strip())
-                        newInspirekeywordStringElement.appendChild(newInspirekeywordNode)
-                        newInspirekeywordElement.appendChild(newInspirekeywordStringElement)
-                        inspireKeywordElement.insertBefore(newInspirekeywordElement,identificationInfo[0].getElementsByTagName('gmd:type')[0])
-                        print ("Inspire Keyword: " + k)
-                else:
-                    # don't fail if there are no inspire keywords
-                    print ("No INSPIRE Keywords")
-
-                # add free text keywords from comma-separated list
-                # strip any spaces from beginning or end of each item
-                keywords = data[10].split(',')
-                keywordElement = identificationInfo[0].getElementsByTagName('gmd:MD_Keywords')[1]
-                for i, k in enumerate(keywords):
-                    newkeywordElement = record.createElement('gmd:keyword')
-                    newkeywordStringElement = record.createElement('gco:CharacterString')
-                    newkeywordNode = record.createTextNode(k.strip())
-                    newkeywordStringElement.appendChild(newkeywordNode)
-                    newkeywordElement.appendChild(newkeywordStringElement)
-                    keywordElement.insertBefore(newkeywordElement,identificationInfo[0].getElementsByTagName('gmd:type')[1])
-                    print ("Descriptive Keyword: " + k.strip())
-                
-                # add lineage
-                lineage = data[26]
-                lineageElement = dataQualityInfo[0].getElementsByTagName('gmd:lineage')[0]
-                lineageNode = record.createTextNode(lineage)
-                lineageElement.childNodes[1].childNodes[1].childNodes[1].appendChild(lineageNode)
-                print ("Lineage: " + lineage)
-                
-                # add temporal extent
-                dates = data[20].split(',')
-                beginDate, endDate = '', ''
-                if len(dates) == 2:
-                    if '/' in data[20]:
-                        beginDate = arrow.get(dates[0],'DD/MM/YYYY').format('YYYY-MM-DD')
-                        endDate = arrow.get(dates[1],'DD/MM/YYYY').format('YYYY-MM-DD')
-                    elif '-' in data[20]:
-                        beginDate = dates[0]
-                        endDate = dates[1]
-                    else:
-                        print ("Temp extent dates in wrong format")
-                    print ("Beginning date: " + beginDate)
-                    print ("End date: " + endDate)
-                else:
-                    beginDate = dates[0]
-                    print ("Beginning date: " + beginDate)
-                temporalElement = identificationInfo[0].getElementsByTagName('gmd:temporalElement')[0]
-                beginDateNode = record.createTextNode(beginDate)
-                endDateNode = record.createTextNode(endDate)
-                temporalElement.childNodes[1].childNodes[1].childNodes[1].childNodes[1].appendChild(beginDateNode)
-                temporalElement.childNodes[1].childNodes[1].childNodes[1].childNodes[3].appendChild(endDateNode)
-                
-                # update gml:TimePeriod id attribute
-                gmlId = '_' + str(uuid.uuid4())
-                timePeriodElement = identificationInfo[0].getElementsByTagName('gml:TimePeriod')[0]
-                timePeriodElement.setAttributeNS('http://www.opengis.net/gml/3.2', 'gml:id', gmlId)
-
-                # add distribution format, version, transfer options
-                distFormats = data[21].split(',')
-                versions = data[22].split(',')
-                print ("Formats: " + str(distFormats))
-                print ("Versions: " + str(versions))
-                nameElement = distributionInfo[0].getElementsByTagName('gmd:MD_Distribution')[0]
-
-                for i, k in zip(distFormats, versions):
-                    newDistroFormatNode = record.createElement('gmd:distributionFormat')
-                    newMDFormatNode = record.createElement('gmd:MD_Format')
-
-                    newDistFormatElement = record.createElement('gmd:name')
-                    newDistFormatStringElement = record.createElement('gco:CharacterString')
-                    newDistFormatNode=record.createTextNode(i)
-                    newDistFormatStringElement.appendChild(newDistFormatNode)
-                    newDistFormatElement.appendChild(newDistFormatStringElement)
-
-                    newMDFormatNode.appendChild(newDistFormatElement)
-                    newDistroFormatNode.appendChild(newMDFormatNode)
-
-                    newVersionElement = record.createElement('gmd:version')
-                    newVersionStringElement = record.createElement('gco:CharacterString')
-                    newVersionNode=record.createTextNode(k)
-                    newVersionStringElement.appendChild(newVersionNode)
-                    newVersionElement.appendChild(newVersionStringElement)
-
-                    newMDFormatNode.appendChild(newVersionElement)
-                    newDistroFormatNode.appendChild(newMDFormatNode)
-
-                    # must be inserted before the transferoptions node
-                    nameElement.insertBefore(newDistroFormatNode, distributionInfo[0].getElementsByTagName('gmd:transferOptions')[0])
-
-                    print ("Distribution format: " + i + " Version: " + k)
-                    
-
-                # add transfer url
-                transferURL = data[24]
-                transferURLElement = distributionInfo[0].getElementsByTagName('gmd:URL')[0]
-                transferURLNode = record.createTextNode(transferURL)
-                transferURLElement.appendChild(transferURLNode)
-                print ("URL: " + transferURL)
-    
-                # add transfer protocol
-                transferProtocol = data[23]
-                transferProtocolElement = distributionInfo[0].getElementsByTagName('gmd:protocol')[0]
-                transferProtocolNode = record.createTextNode(transferProtocol)
-                transferProtocolElement.childNodes[1].appendChild(transferProtocolNode)
-                print ("Protocol: " + transferProtocol)
-                #print ("break")
-                
-
-                # add data quality and repeat it in the level description
-                dataQuality = data[25]
-                dataQualityElement = dataQualityInfo[0].getElementsByTagName('gmd:MD_ScopeCode')[0]
-                #dataQualityDescElement = dataQualityInfo[0].getElementsByTagName('gmd:other')[0]
-                dataQualityNode = record.createTextNode(dataQuality)
-                dataQualityDescNode = record.createTextNode(dataQuality)
-                dataQualityElement.setAttribute("codeListValue", dataQuality)
-                dataQualityElement.appendChild(dataQualityNode)
-                #dataQualityDescElement.childNodes[1].appendChild(dataQualityDescNode)
-                print ("dataquality: " + dataQuality)
-                
-            
-                # add geographic extents - no need to transform as it's in wgs84
-                bng = CRS('epsg:27700')
-                wgs84 = CRS('epsg:4326')
-                try:
-                    west, east, north, south = data[15], data[16], data[17], data[18]
-                    westNode = record.createTextNode(west)
-                    eastNode = record.createTextNode(east)
-                    northNode = record.createTextNode(north)
-                    southNode = record.createTextNode(south)
-                    print ("BBox: %s,%s,%s,%s" % (west,east,south,north))
-                    geoBoundingBoxElement = identificationInfo[0].getElementsByTagName('gmd:EX_GeographicBoundingBox')[0]
-                    geoBoundingBoxElement.childNodes[3].childNodes[1].appendChild(westNode)
-                    geoBoundingBoxElement.childNodes[5].childNodes[1].appendChild(eastNode)
-                    geoBoundingBoxElement.childNodes[7].childNodes[1].appendChild(southNode)
-                    geoBoundingBoxElement.childNodes[9].childNodes[1].appendChild(northNode)
-                except:
-                    # create a metadata record even if there's no extent given
-                    pass
-
-                # # add extent (geographic description)
-                extent = data[19]
-                extentElement = identificationInfo[0].getElementsByTagName('gmd:code')[2]
-                extentNode = record.createTextNode(extent)
-                extentElement.childNodes[1].appendChild(extentNode)
-                print ("Extent: " + extent)
-
-                # Usage Constraints
-                useLimitation = data[11]
-                licenceConstraint = data[12]
-                copyrightConstraint = data[13]
-                constraintsElement = identificationInfo[0].getElementsByTagName('gmd:MD_Constraints')[0]
-                for i in (data[11:14]):
-                    print ("Use Limitation: " + i)
-                    newUseLimitationNode = record.createElement('gmd:useLimitation')
-                    newUseLimitationStringElement= record.createElement('gco:CharacterString')
-                    if i.lower().startswith('copyright'):
-                        newUseLimitationStringNode = record.createTextNode('(c) ' +i)
-                    else:
-                        newUseLimitationStringNode = record.createTextNode(i)
-                    newUseLimitationStringElement.appendChild(newUseLimitationStringNode)
-                    newUseLimitationNode.appendChild(newUseLimitationStringElement)
-                    constraintsElement.appendChild(newUseLimitationNode)
-
-                # Points of Contact
-                # TODO copy to top-level gmd:contact too
-                contactName = data[5]
-                contactEmail = data[6]
-                contactAddress = data[7]
-                contactOrg = data[8]
-                contactPosition = data[9]
-
-                ## Identification Info Point of Contact
-                contactNameElement = identificationInfo[0].getElementsByTagName('gmd:individualName')[0]
-                contactOrgElement = identificationInfo[0].getElementsByTagName('gmd:organisationName')[0]
-                contactPosElement = identificationInfo[0].getElementsByTagName('gmd:positionName')[0]
-                contactAddElement = identificationInfo[0].getElementsByTagName('gmd:deliveryPoint')[0]
-                contactEmailElement = identificationInfo[0].getElementsByTagName('gmd:electronicMailAddress')[0]
-
-                contactNameNode = record.createTextNode(contactName)
-                contactOrgNode = record.createTextNode(contactOrg)
-                contactPositionNode = record.createTextNode(contactPosition)
-                contactAddressNode = record.createTextNode(contactAddress)
-                contactEmailNode = record.createTextNode(contactEmail)
-                contactNameElement.childNodes[1].appendChild(contactNameNode)
-                contactEmailElement.childNodes[1].appendChild(contactEmailNode)
-                contactOrgElement.childNodes[1].appendChild(contactOrgNode)
-                contactPosElement.childNodes[1].appendChild(contactPositionNode)
-                contactAddElement.childNodes[1].appendChild(contactAddressNode)
-
-                ## Metadata Point of Contact
-                metadatacontactNameElement = contact[0].getElementsByTagName('gmd:individualName')[0]
-                metadatacontactOrgElement = contact[0].getElementsByTagName('gmd:organisationName')[0]
-                metadatacontactPosElement = contact[0].getElementsByTagName('gmd:positionName')[0]
-                metadatacontactAddElement = contact[0].getElementsByTagName('gmd:deliveryPoint')[0]
-                metadatacontactEmailElement = contact[0].getElementsByTagName('gmd:electronicMailAddress')[0]
-
-                metadatacontactNameNode = record.createTextNode(contactName)
-                metadatacontactOrgNode = record.createTextNode(contactOrg)
-                metadatacontactPositionNode = record.createTextNode(contactPosition)
-                metadatacontactAddressNode = record.createTextNode(contactAddress)
-                metadatacontactEmailNode = record.createTextNode(contactEmail)
-                metadatacontactNameElement.childNodes[1].appendChild(metadatacontactNameNode)
-                metadatacontactEmailElement.childNodes[1].appendChild(metadatacontactEmailNode)
-                metadatacontactOrgElement.childNodes[1].appendChild(metadatacontactOrgNode)
-                metadatacontactPosElement.childNodes[1].appendChild(metadatacontactPositionNode)
-                metadatacontactAddElement.childNodes[1].appendChild(metadatacontactAddressNode)
-                print ("Name: " + contactName)
-                print ("Email: " + contactEmail)
-                print ("Address: " + contactAddress)
-                print ("Organisation: " + contactOrg)
-                print ("Position: " + contactPosition)
-
-
-                # add dataset reference dates
-                if '/' in data[2]:
-                    creationDate = arrow.get(data[2],'DD/MM/YYYY').format('YYYY-MM-DD')
-                elif '-' in data[2]:
-                    creationDate = data[2]
-                else:
-                    print ("creationdate in wrong format")
-                creationDateElement = identificationInfo[0].getElementsByTagName('gmd:date')[0]
-                creationDateNode = record.createTextNode(creationDate)
-                creationDateElement.childNodes[1].childNodes[1].childNodes[1].appendChild(creationDateNode)
-                print ("Creation date: " + creationDate)
-
-                if '/' in data[3]:
-                    revisionDate = arrow.get(data[3],'DD/MM/YYYY').format('YYYY-MM-DD')
-                elif '-' in data[3]:
-                    revisionDate = data[3]
-                else:
-                    print ("revisiondate in wrong format")
-                revisionDateElement = identificationInfo[0].getElementsByTagName('gmd:date')[2]
-                revisionDateNode = record.createTextNode(revisionDate)
-                revisionDateElement.childNodes[1].childNodes[1].childNodes[1].appendChild(revisionDateNode)
-                print ("Revision Date: " + revisionDate)
-
-                # update frequency
-                updateFrequency = data[27]
-                updateFrequencyElement = identificationInfo[0].getElementsByTagName('gmd:MD_MaintenanceFrequencyCode')[0]
-                updateFrequencyNode = record.createTextNode(updateFrequency)
-                updateFrequencyElement.setAttribute("codeListValue", updateFrequency)
-                updateFrequencyElement.appendChild(updateFrequencyNode)
-                print ("Update Frequency: " + updateFrequency)
-
-                # denominator
-                denominator = data[29]
-                denominatorElement=identificationInfo[0].getElementsByTagName('gmd:denominator')[0]
-                denominatorNode = record.createTextNode(denominator)
-                denominatorElement.childNodes[1].appendChild(denominatorNode)
-                print ("Scale: " + denominator)
-
-
-                # write out the gemini record
-                filename = '../output/%s.xml' % fileId
-                with open(filename,'wb') as test_xml:
-                    test_xml.write(record.toprettyxml(newl="", encoding="utf-8"))
-
-
-            except:
-                e = sys.exc_info()[1]
-                logging.debug("Import failed for entry %s" % data[0])
-                logging.debug("Specific error: %s" % e)
+class TestMetadataImport(unittest.TestCase):
+
+    def testMetadataImport(self):
+        # runs with the options from the command line, or the defaults when run with python -m unittest
+        numrows = getNumrows(command_line_options['numrows'])
+        if numrows is not None:
+            importMetadata(**dict(command_line_options, numrows=numrows))
 
     @skip('')
     def testOWSMetadataImport(self):
+        from owslib.etree import etree
+        from owslib.iso import MD_Metadata
         raw_data = []
         with open('../input/metadata.csv') as csvfile:
             reader = csv.reader(csvfile, dialect='excel')
@@ -448,34 +82,660 @@ class TestMetadataImport(unittest.TestCase):
         outfile.write(md.xml)
 
 
+def importMetadata(numrows='all', **options):
+    '''
+    Import rows of ../input/metadata.csv (or the input option) as gemini records in ../output, with the same options as the
+    command line, e.g. importMetadata(100, backend='fragments', workers=4). Returns the run report.
+    '''
+    global command_line_options
+    unknown = set(options) - set(DEFAULT_OPTIONS)
+    if unknown:
+        raise TypeError('unknown options: %s' % ', '.join(sorted(unknown)))
+    command_line_options = dict(DEFAULT_OPTIONS, **options)
+    checkOptions(command_line_options)
+    numrows = command_line_options['numrows'] = str(numrows)
+
+    # remove existing output files, an archive is replaced as a whole when it is opened,
+    # an incremental import only replaces the records that have changed and a resumed one carries on where it was
+    if command_line_options['output'] == 'dir' and not (command_line_options['incremental'] or command_line_options['resume']):
+        DirectoryWriter().clear()
+        clearQuarantine()
+
+    logging.basicConfig(filename='error.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    workers = command_line_options['workers']
+    backend = command_line_options['backend']
+    serialisation = SERIALISATIONS[command_line_options['serialise']]
+    if workers == 1:
+        renderer = loadTemplate(backend, command_line_options['serialise'])
+
+    # compiling the schema here as well means a bad schema stops the import before any rows are read
+    validator = None
+    if command_line_options['schema']:
+        validator = loadValidator(command_line_options['schema'], command_line_options['schematron'])
+        clearQuarantine()
+
+    # a column mapping is checked before any rows are read, rows are projected onto this order of columns as they are read
+    mapping = loadMapping(command_line_options['mapping']) if command_line_options['mapping'] else None
+
+    # columns order:
+    """
+        title = columns[0]
+        alt_title = columns[1]
+        creation_date = columns[2]
+        revsion_date = columns[3]
+        abstract = columns[4]
+        pointofcontact_name = columns[5]
+        pointofcontact_email = columns[6]
+        pointofcontact_address = columns[7]
+        pointofcontact_org = columns[8]
+        pointofcontact_position = columns[9]
+        keyword = columns[10]
+        use_limitation = columns[11]
+        licence_constraints = columns[12]
+        copyright_constraints = columns[13]
+        topic_category = columns[14]
+        west_bc = columns[15]
+        east_bc = columns[16]
+        north_bc = columns[17]
+        south_bc = columns[18]
+        extent = columns[19]
+        temp_extent = columns[20]
+        data_format = columns[21]
+        data_version = columns [22]
+        transfer_protocol = columns[23]
+        transfer_url = columns[24]
+        data_quality = columns[25]
+        lineage = columns[26]
+        update_freq = columns[27]
+        inspire_keyword = columns[28]
+        denominator = columns[29]
+        bbox_crs = columns[30] (optional, the bounding coordinates are WGS84 if there is no crs here or in --crs)
+    """
+
+    manifest = None
+    if command_line_options['incremental']:
+        # records written in another form are all rebuilt, the key of the usual form is left as it was
+        templateKey = planKey(TEMPLATE) if command_line_options['serialise'] == 'tabs' else '%s:%s' % (planKey(TEMPLATE), command_line_options['serialise'])
+        manifest = Manifest(OUTPUT_DIRECTORY, templateKey, keyColumn(command_line_options['key'], mapping), serialisation.compressed)
+
+    inputs = expandInputs(command_line_options['input'])
+    if not inputs:
+        print (f'There are no csv or xlsx files in {command_line_options["input"]}')
+        return None
+
+    journal = None
+    if command_line_options['journal'] or command_line_options['resume']:
+        journal = Journal(OUTPUT_DIRECTORY, inputs, command_line_options['resume'])
+        if journal.rows:
+            print ("Resuming the import after row %d" % journal.rows)
+
+    stats = RunStats()
+    report = {}
+    started = time.perf_counter()
+    with profiled(command_line_options['profile'], report):
+        output = openOutput(command_line_options['output'], command_line_options['url'],
+                            command_line_options['uploads'], command_line_options['batch'], serialisation.compressed)
+        try:
+            # rows are streamed from each file one at a time, so memory use does not grow with the size of the input
+            rows = timed(readRows(inputs, numrows, min(workers, len(inputs)), mapping, journal), stats)
+            if manifest is not None:
+                rows = manifest.changedRows(rows)
+            elif journal is not None:
+                rows = journal.numberedRows(rows, CHUNK_SIZE)
+            else:
+                rows = ((data, None) for data in rows)
+            if workers > 1:
+                results = importParallel(rows, workers)
+            else:
+                results = importSerial(renderer, output, rows, validator)
+            for failures, records, written, chunkStats in results:
+                start = time.perf_counter()
+                for record in records:
+                    output.write(*record)
+                stats.time('write', start)
+                stats.merge(chunkStats)
+                for title, error in failures:
+                    logging.debug("Import failed for entry %s" % title)
+                    logging.debug("Specific error: %s" % error)
+                if manifest is not None:
+                    manifest.update(written)
+                if journal is not None:
+                    journal.chunkWritten()
+        except BaseException:
+            # an interrupted import can be resumed after the last chunk that was written
+            if journal is not None:
+                journal.save()
+            raise
+        finally:
+            start = time.perf_counter()
+            output.close()
+            stats.time('write', start)
+            # only the geonetwork output can fail after a record has been handed to it
+            stats.unpublished(getattr(output, 'failed', 0))
+
+    if journal is not None:
+        journal.finish()
+
+    if manifest is not None:
+        deleted = manifest.finish(command_line_options['prune'])
+        print ("Incremental import: %(added)d added, %(changed)d changed, %(unchanged)d unchanged" % manifest.counts)
+        for fileId in deleted:
+            print ("%s record for a row no longer in the input: %s" % ('Removed' if command_line_options['prune'] else 'Found', fileId))
+
+    # values that aren't in their vocabulary are listed once each, rather than for every row
+    for (field, value, suggestion), count in stats.problems.most_common():
+        logging.debug("Vocabulary problem in %d rows: %s" % (count, vocabularyMessage(field, value, suggestion)))
+    if stats.problems:
+        print ("Some values aren't in their vocabularies (%d different ones), see error.log%s" % (len(stats.problems), '' if command_line_options['strict'] else ', use --strict to reject those rows'))
+
+    report.update(stats.report(time.perf_counter() - started))
+    print ("%(records)d records written from %(rows)d rows in %(seconds).1f seconds (%(rowsPerSecond)s rows/sec), %(failed)d failed" % report)
+    if command_line_options['report']:
+        report['options'] = command_line_options
+        writeReport(report, command_line_options['report'])
+    else:
+        for line in report.get('profile', report.get('allocations', [])):
+            print (line)
+
+    return report
+
+
+def getNumrows(numrows):
+    # check if there is a command-line argument, otherwise request user input, returns None if the value isn't valid
+    if numrows == None:
+        numrows = (input('Please enter the number of rows you want to be parsed from metadata.csv \nAlternatively, just type in "all", for parsing all the lines\n'))
+
+    if not (numrows == 'all' or numrows.isnumeric()):
+        print(f'The value you have entered ({numrows}) is not valid, please try again. If you need help using this script try running "metadata_import.py -h"')
+        return None
+    return numrows
+
+
+def loadTemplate(backend, serialise='tabs'):
+    serialisation = SERIALISATIONS[serialise]
+    with open(TEMPLATE) as gemini:
+        doc = minidom.parseString(gemini.read().encode( "utf-8" ))
+    if serialisation.stripped:
+        stripWhitespace(doc)
+    return RENDERERS[backend](doc, loadPlan(TEMPLATE, doc, serialisation.stripped), serialisation)
+
+
+def prepareRows(rows):
+    # works out the values that are quicker to do for a whole column of a chunk of rows at once
+    # a value that can't be worked out is replaced by the exception, which is raised when the row is built
+    prepared = [{} for data in rows]
+
+    for field, description, index in (('creationDate', 'creation date', 2), ('revisionDate', 'revision date', 3)):
+        dates = normaliseDates([column(data, index) for data in rows], description)
+        for values, date in zip(prepared, dates):
+            values[field] = date
+
+    # the temporal extent is a begin date, optionally followed by an end date
+    extents = [column(data, 20).split(',') for data in rows]
+    beginDates = normaliseDates([extent[0] for extent in extents], 'temporal extent begin date', required=False, allowPartial=True)
+    endDates = normaliseDates([extent[1] if len(extent) == 2 else '' for extent in extents], 'temporal extent end date', required=False, allowPartial=True)
+    for values, beginDate, endDate in zip(prepared, beginDates, endDates):
+        values['temporalExtent'] = next((date for date in (beginDate, endDate) if isinstance(date, Exception)), (beginDate, endDate))
+
+    # bounding boxes in another crs are reprojected to wgs84 together, rather than one at a time
+    boxes = [tuple(column(data, index) for index in (15, 16, 17, 18)) for data in rows]
+    crsValues = [column(data, CRS_COLUMN).strip() or command_line_options['crs'] for data in rows]
+    for values, box in zip(prepared, reprojectColumn(boxes, crsValues)):
+        values['bbox'] = box
+
+    return prepared
+
+
+def column(data, index):
+    # rows that are too short fail when they are built, so they just get an empty value here
+    return data[index] if index < len(data) else ''
+
+
+def preparedValue(prepared, field):
+    value = prepared[field]
+    if isinstance(value, Exception):
+        raise value
+    return value
+
+
+def echo(*message):
+    # the values of each row are printed as it is imported, unless --quiet is given
+    if not command_line_options['quiet']:
+        print (*message)
+
+
+def rowValues(data, ids=None, prepared=None):
+    # pull the values for each slot of the template out of a csv row
+    if prepared is None:
+        prepared = prepareRows([data])[0]
+    values = {}
+
+    # generate the fileId and gml:TimePeriod id, unless stable ones are given for an incremental import
+    if ids is None:
+        ids = str(uuid.uuid4()), '_' + str(uuid.uuid4())
+    values['fileId'], values['gmlId'] = ids
+
+    # add the title
+    values['title'] = data[0]
+    echo ("\nTitle: " + data[0])
+
+    # add alternative title
+    values['altTitle'] = data[1]
+    echo ("Alt Title: " + data[1])
+
+    # add abstract
+    values['abstract'] = data[4]
+    echo ("Abstract: " + data[4])
+
+    # add topics from comma-separated list
+    topics = data[14].split(',')
+    for t in topics:
+        echo ("Topic: " + t)
+    values['topics'] = [t.strip() for t in topics]
+
+    # add inspire keywords from comma-separated list
+    # strip spaces from beginning or end of each item
+    inspireKeywords = data[28].split(',')
+    for k in inspireKeywords:
+        echo ("Inspire Keyword: " + k)
+    values['inspireKeywords'] = [k.strip() for k in inspireKeywords]
+
+    # add free text keywords from comma-separated list
+    # strip any spaces from beginning or end of each item
+    keywords = [k.strip() for k in data[10].split(',')]
+    for k in keywords:
+        echo ("Descriptive Keyword: " + k)
+    values['keywords'] = keywords
+
+    # add lineage
+    values['lineage'] = data[26]
+    echo ("Lineage: " + data[26])
+
+    # add temporal extent
+    beginDate, endDate = preparedValue(prepared, 'temporalExtent')
+    echo ("Beginning date: " + beginDate)
+    if endDate:
+        echo ("End date: " + endDate)
+    values['beginDate'] = beginDate
+    values['endDate'] = endDate
+
+    # add distribution format, version, transfer options
+    distFormats = data[21].split(',')
+    versions = data[22].split(',')
+    echo ("Formats: " + str(distFormats))
+    echo ("Versions: " + str(versions))
+    values['distributionFormats'] = list(zip(distFormats, versions))
+    for i, k in values['distributionFormats']:
+        echo ("Distribution format: " + i + " Version: " + k)
+
+    # add transfer url
+    values['transferURL'] = data[24]
+    echo ("URL: " + data[24])
+
+    # add transfer protocol
+    values['transferProtocol'] = data[23]
+    echo ("Protocol: " + data[23])
+
+    # add data quality
+    values['dataQuality'] = data[25]
+    echo ("dataquality: " + data[25])
+
+    # add geographic extents, reprojected to wgs84 if they are in another crs
+    west, east, north, south = preparedValue(prepared, 'bbox')
+    values.update(west=west, east=east, north=north, south=south)
+    echo ("BBox: %s,%s,%s,%s" % (west,east,south,north))
+
+    # add extent (geographic description)
+    values['extent'] = data[19]
+    echo ("Extent: " + data[19])
+
+    # Usage Constraints
+    useLimitations = []
+    for i in data[11:14]:
+        echo ("Use Limitation: " + i)
+        if i.lower().startswith('copyright'):
+            useLimitations.append('(c) ' + i)
+        else:
+            useLimitations.append(i)
+    values['useLimitations'] = useLimitations
+
+    # Points of Contact, used for both the identification info and the metadata contact
+    values['contactName'] = data[5]
+    values['contactEmail'] = data[6]
+    values['contactAddress'] = data[7]
+    values['contactOrg'] = data[8]
+    values['contactPosition'] = data[9]
+    echo ("Name: " + data[5])
+    echo ("Email: " + data[6])
+    echo ("Address: " + data[7])
+    echo ("Organisation: " + data[8])
+    echo ("Position: " + data[9])
+
+    # add dataset reference dates
+    values['creationDate'] = preparedValue(prepared, 'creationDate')
+    echo ("Creation date: " + values['creationDate'])
+
+    values['revisionDate'] = preparedValue(prepared, 'revisionDate')
+    echo ("Revision Date: " + values['revisionDate'])
+
+    # update frequency
+    values['updateFrequency'] = data[27]
+    echo ("Update Frequency: " + data[27])
+
+    # denominator
+    values['denominator'] = data[29]
+    echo ("Scale: " + data[29])
+
+    return values
+
+
+def recordValues(data, ids=None, prepared=None, stats=None):
+    start = time.perf_counter()
+    values = rowValues(data, ids, prepared)
+    if stats is not None:
+        stats.time('values', start)
+    return values
+
+
+def importRows(renderer, output, rows, stats, validator=None):
+    # build and write out a record for each (data, ids) row, returning (title, error) for each row that failed
+    # and, for an incremental import, (fileId, digest) for each record written
+    failures, written = [], []
+    start = time.perf_counter()
+    prepared = prepareRows([data for data, ids in rows])
+    start = stats.time('prepare', start)
+    # rows that would fail are rejected here, before any xml is built for them
+    validated = validateRows([data for data, ids in rows], prepared, command_line_options['strict'])
+    stats.time('validate', start)
+    for (data, ids), preparedValues, (error, problems) in zip(rows, prepared, validated):
+        if isinstance(ids, Exception):
+            # a row the manifest skipped for its key
+            stats.failed(ids)
+            failures.append((data[0] if data else '', ids))
+            continue
+        stats.checked(problems)
+        try:
+            if error is not None:
+                raise error
+            values = recordValues(data, ids, preparedValues, stats)
+            fileId, title = values['fileId'], values['title']
+            if validator is None and hasattr(output, 'open'):
+                # the record is serialised straight into its file, rather than into memory first
+                with output.open(fileId, digest=command_line_options['incremental']) as recordFile:
+                    renderer.stream(values, recordFile.stream, stats)
+                    start = time.perf_counter()
+                stats.time('write', start)
+                size, digest = recordFile.size, recordFile.digest
+            else:
+                record = renderer.render(values, stats)
+                if validator is not None:
+                    start = time.perf_counter()
+                    try:
+                        validator.validate(record)
+                    except SchemaValidationError as e:
+                        quarantine(fileId, record, e.messages)
+                        raise
+                    finally:
+                        stats.time('schema', start)
+                start = time.perf_counter()
+                # the output folder gives the size of the file written, records for an archive are counted before compression
+                size = output.write(fileId, title, record) or len(record)
+                stats.time('write', start)
+                digest = outputDigest(record) if command_line_options['incremental'] else None
+            stats.written(size)
+            if command_line_options['incremental']:
+                written.append((fileId, digest))
+        except Exception:
+            e = sys.exc_info()[1]
+            stats.failed(e)
+            failures.append((data[0] if data else '', e))
+    stats.cached(*renderer.cacheCounts())
+    return failures, written
+
+
+def importSerial(renderer, output, rows, validator=None):
+    for chunk in chunked(rows):
+        stats = RunStats()
+        failures, written = importRows(renderer, output, chunk, stats, validator)
+        yield failures, [], written, stats
+
+
+def chunked(rows):
+    return iter(lambda: list(itertools.islice(rows, CHUNK_SIZE)), [])
+
+
+def initWorker(options):
+    global command_line_options, workerRenderer, workerOutput, workerValidator
+    command_line_options = options
+    workerRenderer = loadTemplate(options['backend'], options['serialise'])
+    if options['schema']:
+        workerValidator = loadValidator(options['schema'], options['schematron'])
+    # workers write files straight to the output folder, but records for an archive are sent back to the single archive writer
+    workerOutput = DirectoryWriter(compressed=SERIALISATIONS[options['serialise']].compressed) if options['output'] == 'dir' else RecordCollector()
+
+
+def importChunk(rows):
+    stats = RunStats()
+    failures, written = importRows(workerRenderer, workerOutput, rows, stats, workerValidator)
+    records = workerOutput.drain() if isinstance(workerOutput, RecordCollector) else []
+    # exceptions are sent back as strings as not all of them can be pickled, they are already counted in the stats
+    return [(title, str(e)) for title, e in failures], records, written, stats
+
+
+def importParallel(rows, workers):
+    # results are yielded in input order, so error.log is the same whatever the number of workers,
+    # and only a few chunks are queued per worker so memory stays bounded on very large inputs
+    import multiprocessing
+    pending = collections.deque()
+    with multiprocessing.Pool(workers, initializer=initWorker, initargs=(command_line_options,)) as pool:
+        for chunk in chunked(rows):
+            pending.append(pool.apply_async(importChunk, (chunk,)))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def readRows(inputs, numrows, readers=1, mapping=None, journal=None):
+    # lazily yield the data rows of each input file in turn, skipping their headers and stopping after numrows rows in all
+    # with a journal, (data, position) is yielded for each row, starting from the position of the journal
+    limit = None if numrows == 'all' else int(numrows)
+    rowcount = 0
+    if journal is None:
+        rows = readInputs(inputs, readers, mapping)
+    else:
+        rows = positionedRows(inputs, mapping, journal.position)
+        if limit is not None:
+            limit = max(limit - journal.rows, 0)
+    try:
+        for columns in itertools.islice(rows, limit):
+            rowcount += 1
+            yield columns
+    finally:
+        rows.close()
+    if limit is not None and rowcount < limit:
+        print(f'The number of rows you have entered ({numrows}) was greater than the number of rows in {", ".join(inputs)} ({rowcount}) so all lines have been parsed and exported.')
+
+
 def getArguments(argv):
-    numrows = ""
-    opts, args = getopt.getopt(argv,"han:",["help","all", "numrows="])
+    options = dict(DEFAULT_OPTIONS)
+    opts, args = getopt.getopt(argv,"han:w:b:o:ik:c:qf:m:",["help","all", "input=", "mapping=", "serialise=", "journal", "resume", "numrows=", "workers=", "backend=", "output=", "incremental", "key=", "prune", "crs=", "quiet", "report=", "profile=", "url=", "uploads=", "batch=", "strict", "schema=", "schematron="])
     for opt, arg in opts:
         if opt in ("-h", "--help"):
-            print ("usage: test.py [-h | --help] [-a | --all] [-n NUMBER | --numrows NUMBER]\n")
+            print ("usage: metadata_import.py [-h | --help] [-a | --all] [-n NUMBER | --numrows NUMBER] [-f PATH | --input PATH] [-m FILE | --mapping FILE] [-w NUMBER | --workers NUMBER] [-b NAME | --backend NAME] [-o FORMAT | --output FORMAT] [--serialise FORM] [-i | --incremental] [-k COLUMN | --key COLUMN] [--prune] [--journal] [--resume] [-c CRS | --crs CRS] [-q | --quiet] [--report FILE] [--profile NAME] [--url URL] [--uploads NUMBER] [--batch NUMBER] [--strict] [--schema FILE] [--schematron FILE]\n")
             print ("optional arguments: \n", 
                    "-h, --help \t\t\t show this help message and exit\n",
                    "-a, --all \t\t\t parse all the rows in metadata.csv\n",
-                   "-n NUMBER, --numrows NUMBER \t the number of rows you want to parse from metadata.csv")
+                   "-n NUMBER, --numrows NUMBER \t the number of rows you want to parse from metadata.csv\n",
+                   "-f PATH, --input PATH \t\t a csv or xlsx file, or a folder or glob pattern of them, to read instead of ../input/metadata.csv\n",
+                   "-m FILE, --mapping FILE \t a json file saying which column each field is read from, for files laid out differently to the sample\n",
+                   "-w NUMBER, --workers NUMBER \t the number of processes used to build the records (default 1)\n",
+                   "-b NAME, --backend NAME \t how the records are rendered, minidom (default) or fragments\n",
+                   "-o FORMAT, --output FORMAT \t dir (default) writes one xml file per record, zip or mef write all the records to a single archive, geonetwork publishes them to --url\n",
+                   "--serialise FORM \t\t how each record is written, tabs (default), pretty, compact, or gzip for compact records in .xml.gz files\n",
+                   "-i, --incremental \t\t only rebuild the records for rows that are new or have changed since the last run\n",
+                   "-k COLUMN, --key COLUMN \t the column that identifies each row in an incremental import, a field name, a header in the mapping or a number counting from 0, by default the whole row is used\n",
+                   "--prune \t\t\t remove the records for rows that are no longer in metadata.csv in an incremental import\n",
+                   "--journal \t\t\t keep track of the rows that have been written, so an interrupted import can be resumed\n",
+                   "--resume \t\t\t carry on with an interrupted import from where its journal says it got to\n",
+                   "-c CRS, --crs CRS \t\t the crs of the bounding coordinates, e.g. EPSG:27700, when it isn't given in the crs column (default WGS84)\n",
+                   "-q, --quiet \t\t\t don't print the values of each row as it is imported\n",
+                   "--report FILE \t\t\t write the timings of each stage, peak memory and failures by column to a json file\n",
+                   "--profile NAME \t\t\t profile the run with cprofile or tracemalloc, the results are added to the report (use with -w 1)\n",
+                   "--url URL \t\t\t the GeoNetwork to publish to with -o geonetwork, e.g. http://localhost:8080/geonetwork\n",
+                   "--uploads NUMBER \t\t the number of records uploaded to GeoNetwork at the same time (default 4)\n",
+                   "--batch NUMBER \t\t\t upload the records to GeoNetwork in MEF archives of NUMBER records (default 1, one request per record)\n",
+                   "--strict \t\t\t reject rows with values that aren't in the vocabularies, rather than just listing them in error.log\n",
+                   "--schema FILE \t\t\t validate each record against a local copy of the ISO 19139 / GEMINI xsd, invalid records go to output/quarantine\n",
+                   "--schematron FILE \t\t validate each record against these Schematron rules as well, needs --schema")
             sys.exit()
 
         elif opt in ("-n", "--numrows"):
-            numrows = arg
-            print ("Parsing", numrows, "rows from metadata.csv")
-            return numrows
+            options['numrows'] = arg
+            print ("Parsing", arg, "rows from metadata.csv")
 
         elif opt in ("-a", "--all"):
-            numrows = "all"
+            options['numrows'] = "all"
             print ("Parsing all the rows in metadata.csv")
-            return numrows
 
-if __name__ == "__main__":
+        elif opt in ("-f", "--input"):
+            inputs = expandInputs(arg)
+            if not inputs or not all(os.path.isfile(path) for path in inputs):
+                print (f'There are no csv or xlsx files at {arg}')
+                sys.exit(2)
+            options['input'] = arg
 
-    # command-line arguments have to be stored in a variable before unittest runs, otherwise there is an error
-    command_line_arg_numrows = getArguments(sys.argv[1:])
+        elif opt in ("-m", "--mapping"):
+            try:
+                loadMapping(arg)
+            except ValueError as e:
+                print (e)
+                sys.exit(2)
+            options['mapping'] = arg
+
+        elif opt in ("-w", "--workers"):
+            if not arg.isnumeric() or int(arg) < 1:
+                print (f'The number of workers ({arg}) must be a whole number greater than 0')
+                sys.exit(2)
+            options['workers'] = int(arg)
+
+        elif opt in ("-b", "--backend"):
+            if arg not in RENDERERS:
+                print (f'The backend ({arg}) must be one of: {", ".join(RENDERERS)}')
+                sys.exit(2)
+            options['backend'] = arg
+
+        elif opt in ("-o", "--output"):
+            if arg not in OUTPUT_FORMATS:
+                print (f'The output format ({arg}) must be one of: {", ".join(OUTPUT_FORMATS)}')
+                sys.exit(2)
+            options['output'] = arg
+
+        elif opt == "--serialise":
+            if arg not in SERIALISATIONS:
+                print (f'The serialisation ({arg}) must be one of: {", ".join(SERIALISATIONS)}')
+                sys.exit(2)
+            options['serialise'] = arg
+
+        elif opt in ("-i", "--incremental"):
+            options['incremental'] = True
+
+        elif opt in ("-k", "--key"):
+            options['key'] = int(arg) if arg.isnumeric() else arg
+            options['incremental'] = True
+
+        elif opt == "--prune":
+            options['prune'] = True
+            options['incremental'] = True
+
+        elif opt in ("--journal", "--resume"):
+            options[opt[2:]] = True
+
+        elif opt in ("-c", "--crs"):
+            try:
+                checkCrs(arg)
+            except ValueError as e:
+                print (e)
+                sys.exit(2)
+            options['crs'] = arg
+
+        elif opt in ("-q", "--quiet"):
+            options['quiet'] = True
+
+        elif opt == "--report":
+            options['report'] = arg
+
+        elif opt == "--profile":
+            if arg not in PROFILERS:
+                print (f'The profiler ({arg}) must be one of: {", ".join(PROFILERS)}')
+                sys.exit(2)
+            options['profile'] = arg
+
+        elif opt in ("--schema", "--schematron"):
+            if not os.path.isfile(arg):
+                print (f'The {opt[2:]} file ({arg}) does not exist')
+                sys.exit(2)
+            options[opt[2:]] = arg
+
+        elif opt == "--strict":
+            options['strict'] = True
+
+        elif opt == "--url":
+            options['url'] = arg
+
+        elif opt in ("--uploads", "--batch"):
+            if not arg.isnumeric() or int(arg) < 1:
+                print (f'The number of {opt[2:]} ({arg}) must be a whole number greater than 0')
+                sys.exit(2)
+            options[opt[2:]] = int(arg)
+
+    try:
+        checkOptions(options)
+    except ValueError as e:
+        print (e)
+        sys.exit(2)
+
+    return options
+
+def checkOptions(options):
+    # the options that only work together with others, checked for the command line and for callers of importMetadata alike
+    if options['incremental'] and options['output'] != 'dir':
+        raise ValueError('An incremental import can only be used with the dir output format')
+
+    if (options['journal'] or options['resume']) and (options['output'] != 'dir' or options['incremental']):
+        raise ValueError('Only a full import to the dir output can be journaled and resumed, an incremental import skips the rows it has done already')
+
+    if SERIALISATIONS[options['serialise']].compressed and options['output'] != 'dir':
+        raise ValueError('Only the dir output can be gzip compressed, the archives are compressed already and GeoNetwork needs plain xml')
+
+    # a header can only be used as the key once the mapping is known
+    keyColumn(options['key'], loadMapping(options['mapping']) if options['mapping'] else None)
+
+    if options['schematron'] and not options['schema']:
+        raise ValueError('Schematron rules can only be checked along with the schema, use --schema as well')
+
+    if options['output'] == 'geonetwork' and not options['url']:
+        raise ValueError('Publishing to GeoNetwork needs its address, e.g. --url http://localhost:8080/geonetwork')
+
+def main(argv=None):
+    # the command-line entry point, returns the exit status
+    options = getArguments(sys.argv[1:] if argv is None else argv)
+    numrows = getNumrows(options.pop('numrows'))
+    if numrows is None:
+        return 2
+    try:
+        report = importMetadata(numrows, **options)
+    except (MappingError, JournalError, PublishError) as e:
+        # an input file without the columns named in the mapping, a journal that can't be resumed
+        # or a GeoNetwork that can't be reached stops the import
+        print (e)
+        return 2
+    if report is None:
+        return 2
+    # records that couldn't be published are listed in error.log, the exit status lets a scheduled import notice them
+    return 1 if report['publishFailed'] else 0
 
-    # any command-line arguments passed outside of unittest have to be deleted before unittest runs, otherwise there is an error 
-    del sys.argv[1:]
 
-    unittest.main()
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+# coding=utf-8
+
+'''
+Destinations for the generated gemini records.
+
+Records are either streamed into one xml file each in the output folder, optionally gzip
+compressed, or into a single ZIP or GeoNetwork MEF archive by a background thread, so
+compression and disk I/O overlap with building the next records.
+'''
+
+import io
+import os
+import csv
+import gzip
+import queue
+import hashlib
+import shutil
+import tempfile
+import threading
+import zipfile
+import datetime
+import contextlib
+
+OUTPUT_DIRECTORY = '../output'
+
+# number of records waiting for the archive writer before record building blocks
+QUEUE_SIZE = 256
+
+MEF_INFO = '''<?xml version="1.0" encoding="UTF-8"?>
+<info version="2.0">
+  <general>
+    <createDate>%(date)s</createDate>
+    <changeDate>%(date)s</changeDate>
+    <schema>iso19139.gemini23</schema>
+    <isTemplate>false</isTemplate>
+    <format>full</format>
+    <localId />
+    <uuid>%(fileId)s</uuid>
+    <siteId />
+    <siteName />
+  </general>
+  <categories />
+  <privileges />
+  <public />
+  <private />
+</info>
+'''
+
+
+def recordName(fileId, compressed=False):
+    # the name of a record's file in the output folder
+    return '%s.xml.gz' % fileId if compressed else '%s.xml' % fileId
+
+
+class CountingFile(io.BufferedIOBase):
+    # passes the bytes of a record on to its file, counting them and optionally keeping a digest of them
+
+    def __init__(self, file, digest=False):
+        self.file = file
+        self.size = 0
+        self.hash = hashlib.sha1() if digest else None
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.size += len(data)
+        if self.hash is not None:
+            self.hash.update(data)
+        return self.file.write(data)
+
+
+@contextlib.contextmanager
+def replacedFile(path, sync=False):
+    # writes a small text file such as the manifest next to path and then replaces path with it
+    # so an interrupted or concurrent run never reads a half-written one, sync also puts it on disk before it's replaced
+    tempPath = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        with open(tempPath, 'w') as file:
+            yield file
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(tempPath, path)
+    except BaseException:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+        raise
+
+
+class RecordFile:
+    # a record being streamed into its file, the xml is written to stream
+    # it is written next to the file first, so an error part way through leaves the previous record in place
+
+    def __init__(self, path, compressed=False, digest=False):
+        self.path = path
+        self.file = open(path + '.part', 'wb')
+        self.counter = CountingFile(self.file, digest)
+        # mtime is left out of the gzip header so the same record always gives the same file
+        self.stream = gzip.GzipFile(os.path.basename(path)[:-3], 'wb', fileobj=self.counter, mtime=0) if compressed else self.counter
+        self.size = None
+        self.digest = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, exc, traceback):
+        try:
+            if self.stream is not self.counter:
+                self.stream.close()
+        finally:
+            self.file.close()
+        if excType is not None:
+            os.remove(self.file.name)
+            return
+        os.replace(self.file.name, self.path)
+        self.size = self.counter.size
+        if self.counter.hash is not None:
+            self.digest = self.counter.hash.hexdigest()
+
+
+class DirectoryWriter:
+
+    def __init__(self, directory=OUTPUT_DIRECTORY, compressed=False):
+        self.directory = directory
+        self.compressed = compressed
+
+    def clear(self):
+        # remove existing output files
+        for file in os.listdir(self.directory):
+            if file not in ['.gitignore'] and os.path.isfile(os.path.join(self.directory, file)):
+                os.remove(os.path.join(self.directory, file))
+
+    def open(self, fileId, digest=False):
+        return RecordFile(os.path.join(self.directory, recordName(fileId, self.compressed)), self.compressed, digest)
+
+    def write(self, fileId, title, data):
+        # returns the number of bytes written, which is smaller than the record if it's compressed
+        with self.open(fileId) as recordFile:
+            recordFile.stream.write(data)
+        return recordFile.size
+
+    def close(self):
+        pass
+
+
+class RecordCollector:
+    # holds the records built by a worker process until they are handed back to the archive writer
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, fileId, title, data):
+        self.records.append((fileId, title, data))
+
+    def drain(self):
+        records, self.records = self.records, []
+        return records
+
+
+class ArchiveWriter:
+
+    def __init__(self, path, mef=False):
+        self.mef = mef
+        # the previous run's archive is replaced as a whole when it is opened
+        self.archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        self.created = datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+        self.index = io.TextIOWrapper(tempfile.TemporaryFile(), encoding='utf-8', newline='')
+        self.indexWriter = csv.writer(self.index)
+        self.indexWriter.writerow(['fileId', 'title', 'member'])
+        self.error = None
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.thread = threading.Thread(target=self.run, name='archive-writer', daemon=True)
+        self.thread.start()
+
+    def clear(self):
+        pass
+
+    def write(self, fileId, title, data):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((fileId, title, data))
+
+    def run(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            # after a failure keep taking records off the queue so record building never blocks
+            if self.error is None:
+                try:
+                    self.add(*record)
+                except Exception as e:
+                    self.error = e
+
+    def add(self, fileId, title, data):
+        if self.mef:
+            member = '%s/metadata/metadata.xml' % fileId
+            self.archive.writestr('%s/info.xml' % fileId, MEF_INFO % {'date': self.created, 'fileId': fileId})
+        else:
+            member = '%s.xml' % fileId
+            self.indexWriter.writerow([fileId, title, member])
+        self.archive.writestr(member, data)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        try:
+            if not self.mef and self.error is None:
+                # each MEF record is indexed by its own info.xml, a plain ZIP gets an index of all records
+                self.index.flush()
+                self.index.buffer.seek(0)
+                with self.archive.open('index.csv', 'w') as index:
+                    shutil.copyfileobj(self.index.buffer, index)
+        finally:
+            self.index.close()
+            self.archive.close()
+        if self.error is not None:
+            raise self.error
+
+
+def openOutput(outputFormat, url=None, uploads=4, batch=1, compressed=False):
+    if outputFormat == 'zip':
+        return ArchiveWriter(os.path.join(OUTPUT_DIRECTORY, 'metadata.zip'))
+    elif outputFormat == 'mef':
+        return ArchiveWriter(os.path.join(OUTPUT_DIRECTORY, 'metadata.mef'), mef=True)
+    elif outputFormat == 'geonetwork':
+        # requests is only imported when publishing
+        from publisher import GeoNetworkWriter
+        return GeoNetworkWriter(url, uploads, batch)
+    return DirectoryWriter(compressed=compressed)
+
+
+OUTPUT_FORMATS = ['dir', 'zip', 'mef', 'geonetwork']
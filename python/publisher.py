@@ -0,0 +1,154 @@
+# coding=utf-8
+
+'''
+Publishing the generated gemini records straight to GeoNetwork.
+
+Records are sent to the GeoNetwork REST API as they are built, over a single pooled
+requests session, by a few threads so several uploads are in flight at once. Server
+errors are retried with backoff, and records can be sent in batches as a MEF archive
+instead of one request each.
+'''
+
+import io
+import os
+import logging
+import zipfile
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from output_writers import MEF_INFO
+
+RECORDS_API = '/srv/api/records'
+
+# the record is replaced if GeoNetwork already has one with the same fileIdentifier
+IMPORT_PARAMETERS = {'metadataType': 'METADATA', 'uuidProcessing': 'OVERWRITE'}
+
+# credentials are read from the environment so they don't end up in the shell history
+USERNAME_VARIABLE = 'GEONETWORK_USERNAME'
+PASSWORD_VARIABLE = 'GEONETWORK_PASSWORD'
+
+RETRIES = 5
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = [500, 502, 503, 504]
+
+
+class PublishError(Exception):
+    pass
+
+
+def openSession(url, uploads):
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    # error.log is written at debug level, which would list every connection urllib3 makes
+    logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+    session = requests.Session()
+    # the records are uploaded with PUT and POST, which urllib3 doesn't retry by default
+    retry = Retry(total=RETRIES, backoff_factor=BACKOFF_FACTOR, status_forcelist=RETRY_STATUSES,
+                  allowed_methods=None, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=uploads, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Accept'] = 'application/json'
+
+    username = os.environ.get(USERNAME_VARIABLE)
+    if username:
+        session.auth = (username, os.environ.get(PASSWORD_VARIABLE, ''))
+
+    # GeoNetwork only accepts changes with the XSRF token it hands out in a cookie
+    # a wrong address or credentials stop the import here, rather than failing every upload after its retries
+    try:
+        session.get(url + '/srv/api/me').raise_for_status()
+    except requests.RequestException as e:
+        session.close()
+        raise PublishError("Can't connect to GeoNetwork at %s: %s" % (url, e))
+    token = session.cookies.get('XSRF-TOKEN')
+    if token:
+        session.headers['X-XSRF-TOKEN'] = token
+    return session
+
+
+class GeoNetworkWriter:
+
+    def __init__(self, url, uploads=4, batch=1):
+        self.url = url.rstrip('/')
+        self.batch = batch
+        self.session = openSession(self.url, uploads)
+        self.executor = ThreadPoolExecutor(uploads, thread_name_prefix='geonetwork-upload')
+        # only a couple of uploads are queued for each thread, so memory stays bounded when the server is slow
+        self.slots = threading.BoundedSemaphore(uploads * 2)
+        self.lock = threading.Lock()
+        self.pending = []
+        self.created = datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+        self.published = 0
+        self.failed = 0
+
+    def clear(self):
+        pass
+
+    def write(self, fileId, title, data):
+        self.pending.append((fileId, title, data))
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        records, self.pending = self.pending, []
+        if not records:
+            return
+        self.slots.acquire()
+        future = self.executor.submit(self.upload, records)
+        future.add_done_callback(lambda future: self.finished(records, future))
+
+    def upload(self, records):
+        import requests
+        if len(records) == 1:
+            fileId, title, data = records[0]
+            response = self.session.put(self.url + RECORDS_API, params=IMPORT_PARAMETERS, data=data,
+                                        headers={'Content-Type': 'application/xml'})
+        else:
+            files = {'file': ('records.mef', self.mefArchive(records), 'application/zip')}
+            response = self.session.post(self.url + RECORDS_API, params=IMPORT_PARAMETERS, files=files)
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            raise PublishError("%s: %s" % (e, response.text[:500]))
+
+        # a record GeoNetwork couldn't import is listed in the errors of the report, rather than failing the request
+        try:
+            errors = response.json().get('errors')
+        except ValueError:
+            errors = None
+        if errors:
+            raise PublishError("GeoNetwork reported errors: %s" % errors)
+
+    def mefArchive(self, records):
+        # a batch is sent as a MEF archive with a folder for each record, in the same layout as the mef output
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for fileId, title, data in records:
+                archive.writestr('%s/info.xml' % fileId, MEF_INFO % {'date': self.created, 'fileId': fileId})
+                archive.writestr('%s/metadata/metadata.xml' % fileId, data)
+        return buffer.getvalue()
+
+    def finished(self, records, future):
+        self.slots.release()
+        error = future.exception()
+        with self.lock:
+            if error is None:
+                self.published += len(records)
+                return
+            self.failed += len(records)
+            for fileId, title, data in records:
+                logging.debug("Publishing failed for entry %s" % title)
+                logging.debug("Specific error: %s" % error)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.executor.shutdown(wait=True)
+            self.session.close()
+        print ("Published %d records to %s, %d failed" % (self.published, self.url, self.failed))
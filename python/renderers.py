@@ -0,0 +1,278 @@
+# coding=utf-8
+
+'''
+Backends that turn the values of a row into a serialised gemini record.
+
+The minidom backend clones the template and fills in the slots of the plan. The
+fragments backend renders the template once with a placeholder in every slot, splits
+the result into pre-escaped static byte fragments and then produces each record by
+joining those fragments with the escaped row values, without building a DOM at all.
+Both produce byte-identical xml in any of the serialisation forms. Gzipped records hold
+the same xml, but the compressed files themselves differ between the backends.
+
+Contact details and lists such as keywords and use limitations tend to repeat across
+thousands of rows, so the fragments backend renders each of those blocks once for each
+distinct set of values and keeps the bytes in a bounded least-recently-used cache.
+'''
+
+import io
+import re
+import time
+import operator
+import functools
+from collections import namedtuple
+
+from template_plan import TEXT, CODE, ATTRIBUTE, APPEND, INSERT_BEFORE, GML_NAMESPACE, \
+    ITEM_BUILDERS, ITEM_PARTS, resolve, fillRecord
+
+# placeholders are built from private use characters so they can't clash with the template
+PLACEHOLDER = '\ue000%d\ue001'
+PLACEHOLDER_PATTERN = re.compile('\ue000(\\d+)\ue001')
+
+# the characters minidom may escape in text and attribute values
+SPECIAL_CHARACTERS = '&<>"\'\r\n\t'
+
+# the contact slots next to each other in the template are rendered and cached as one block
+CACHED_RUNS = frozenset(['contactName', 'contactEmail', 'contactAddress', 'contactOrg', 'contactPosition'])
+
+# the number of rendered blocks kept, a block is a few hundred bytes
+BLOCK_CACHE_SIZE = 4096
+
+# the indent added for each level, the line ending, whether the whitespace of the template is left out
+# and whether the record files are gzip compressed
+Serialisation = namedtuple('Serialisation', ['indent', 'newline', 'stripped', 'compressed'])
+
+# tabs is how records have always been written, indented with tabs but on one line and keeping the template's whitespace
+SERIALISATIONS = {
+    'tabs': Serialisation('\t', '', False, False),
+    'pretty': Serialisation('\t', '\n', True, False),
+    'compact': Serialisation('', '', True, False),
+    'gzip': Serialisation('', '', True, True),
+}
+
+
+class MinidomRenderer:
+
+    def __init__(self, doc, plan, serialisation=SERIALISATIONS['tabs']):
+        self.doc = doc
+        self.plan = plan
+        self.indent = serialisation.indent
+        self.newline = serialisation.newline
+
+    def render(self, values, stats=None):
+        buffer = io.BytesIO()
+        self.stream(values, buffer, stats)
+        return buffer.getvalue()
+
+    def cacheCounts(self):
+        # every record is built from scratch
+        return 0, 0
+
+    def stream(self, values, output, stats=None):
+        # writes the record to a binary file as it is serialised, rather than building it as one string first
+        # stats, if given, gets the time spent filling in the template and serialising it
+        start = time.perf_counter()
+        record = fillRecord(self.doc.cloneNode(self.doc), self.plan, values)
+        if stats is not None:
+            start = stats.time('fill', start)
+        # the same writer toprettyxml uses, so the output is the same
+        writer = io.TextIOWrapper(output, encoding='utf-8', errors='xmlcharrefreplace', newline='\n')
+        record.writexml(writer, '', self.indent, self.newline, 'utf-8')
+        writer.detach()
+        if stats is not None:
+            stats.time('serialise', start)
+
+
+class FragmentRenderer:
+
+    def __init__(self, doc, plan, serialisation=SERIALISATIONS['tabs']):
+        record = doc.cloneNode(doc)
+        self.escapeText, self.escapeAttribute = probeEscapes(record)
+        self.indent = serialisation.indent
+        self.newline = serialisation.newline
+
+        # an element left with nothing but a text node is written inline by minidom, which changes the
+        # static fragments around it, so records without any items for those fields are rendered by minidom
+        self.fallback = MinidomRenderer(doc, plan, serialisation)
+        self.inlineWhenEmpty = set()
+
+        # fill every slot with a numbered placeholder, keeping track of what each one stands for
+        holes = []
+        markers = {}
+        targets = [resolve(record, slot.path) for slot in plan]
+        for slot, node in zip(plan, targets):
+            if slot.mode in (TEXT, CODE):
+                if slot.mode == CODE:
+                    node.setAttribute('codeListValue', self.placeholder(holes, 'attribute', slot.field))
+                node.appendChild(record.createTextNode(self.placeholder(holes, 'text', slot.field)))
+            elif slot.mode == ATTRIBUTE:
+                node.setAttributeNS(GML_NAMESPACE, slot.attribute, self.placeholder(holes, 'attribute', slot.field))
+            else:
+                # repeated children are marked with a comment, which minidom writes on its own indented line
+                placeholder = self.placeholder(holes, 'items', slot.field)
+                if slot.mode == APPEND:
+                    if not node.childNodes or (len(node.childNodes) == 1 and node.firstChild.nodeType == node.TEXT_NODE):
+                        self.inlineWhenEmpty.add(slot.field)
+                    node.appendChild(record.createComment(placeholder))
+                    indent = self.indent * len(slot.path)
+                elif slot.mode == INSERT_BEFORE:
+                    node.parentNode.insertBefore(record.createComment(placeholder), node)
+                    indent = self.indent * (len(slot.path) - 1)
+                markers[placeholder] = indent
+                holes[-1] = ('items', slot.field, self.itemFragments(record, slot.field, indent))
+
+        skeleton = record.toprettyxml(indent=self.indent, newl=self.newline, encoding="utf-8").decode('utf-8')
+        for placeholder, indent in markers.items():
+            skeleton = skeleton.replace('%s<!--%s-->%s' % (indent, placeholder, self.newline), placeholder)
+
+        fragments, order = splitPlaceholders(skeleton)
+        self.fragments, self.holes, self.blocks = groupBlocks(fragments, [holes[index] for index in order])
+        # each instance has its own cache, so its hits and misses can be counted
+        self.renderBlock = functools.lru_cache(maxsize=BLOCK_CACHE_SIZE)(self.renderBlockValues)
+        self.counted = 0, 0
+
+    @staticmethod
+    def placeholder(holes, kind, field):
+        holes.append((kind, field, None))
+        return PLACEHOLDER % (len(holes) - 1)
+
+    def itemFragments(self, record, field, indent):
+        # render a single item with placeholders in place of its parts
+        parts = ITEM_PARTS.get(field, 1)
+        item = tuple(PLACEHOLDER % i for i in range(parts))
+        element = ITEM_BUILDERS[field](record, item if parts > 1 else item[0])
+        writer = io.StringIO()
+        element.writexml(writer, indent, self.indent, self.newline)
+        return splitPlaceholders(writer.getvalue())
+
+    def render(self, values, stats=None):
+        for field in self.inlineWhenEmpty:
+            if not values[field]:
+                return self.fallback.render(values, stats)
+
+        # filling in and serialising are the same step here, so it is all counted as serialising
+        start = time.perf_counter()
+        output = [self.fragments[0]]
+        self.fill(self.holes, self.fragments[1:], values, output)
+        data = b''.join(output)
+        if stats is not None:
+            stats.time('serialise', start)
+        return data
+
+    def fill(self, holes, fragments, values, output):
+        # appends the rendered value of each hole followed by the static fragment after it
+        escapeText = self.escapeText
+        for (kind, field, extra), fragment in zip(holes, fragments):
+            if kind == 'text':
+                output.append(encode(escapeText(values[field])))
+            elif kind == 'attribute':
+                output.append(encode(self.escapeAttribute(values[field])))
+            elif kind == 'block':
+                output.append(self.renderBlock(field, extra(values)))
+            else:
+                itemStatic, itemOrder = extra
+                for item in values[field]:
+                    if len(itemOrder) == 1:
+                        item = (item,)
+                    output.append(itemStatic[0])
+                    for part, static in zip(itemOrder, itemStatic[1:]):
+                        output.append(encode(escapeText(item[part])))
+                        output.append(static)
+            output.append(fragment)
+
+    def renderBlockValues(self, index, key):
+        holes, fragments = self.blocks[index]
+        # the key of a block with a single hole is the value itself
+        values = dict(zip((field for kind, field, extra in holes), key)) if len(holes) > 1 else {holes[0][1]: key}
+        output = []
+        self.fill(holes, fragments + [b''], values, output)
+        return b''.join(output)
+
+    def cacheCounts(self):
+        # the hits and misses of the block cache since it was last asked
+        info = self.renderBlock.cache_info()
+        hits, misses = self.counted
+        self.counted = info.hits, info.misses
+        return info.hits - hits, info.misses - misses
+
+    def stream(self, values, output, stats=None):
+        # the record is already held as a list of pieces, writing them joined is quicker than many small writes
+        output.write(self.render(values, stats))
+
+
+def groupBlocks(fragments, holes):
+    # makes each list, and each run of contact slots with the fragments between them, into a single block hole
+    # returns the fragments and holes that are left, with the key function of each block, and the holes and
+    # inner fragments of each block
+    blockFragments, blockHoles, blocks = [fragments[0]], [], []
+    start = 0
+    while start < len(holes):
+        kind, field, extra = holes[start]
+        end = start + 1
+        if field in CACHED_RUNS:
+            while end < len(holes) and holes[end][1] in CACHED_RUNS:
+                end += 1
+        elif kind != 'items':
+            blockHoles.append(holes[start])
+            blockFragments.append(fragments[start + 1])
+            start = end
+            continue
+        blocks.append((holes[start:end], fragments[start + 1:end]))
+        # the key of a block in the cache is its values, with a list turned into a tuple
+        if kind == 'items':
+            key = lambda values, field=field: tuple(values[field])
+        else:
+            key = operator.itemgetter(*(field for kind, field, extra in holes[start:end]))
+        blockHoles.append(('block', len(blocks) - 1, key))
+        blockFragments.append(fragments[end])
+        start = end
+    return blockFragments, blockHoles, blocks
+
+
+def encode(value):
+    # the same error handling minidom uses when it encodes the document
+    return value.encode('utf-8', 'xmlcharrefreplace')
+
+
+def splitPlaceholders(text):
+    # returns the static byte fragments and the placeholder numbers that sit between them
+    pieces = PLACEHOLDER_PATTERN.split(text)
+    return [encode(piece) for piece in pieces[0::2]], [int(index) for index in pieces[1::2]]
+
+
+def probeEscapes(record):
+    # ask minidom how it escapes each special character so the output matches whatever python version is running
+    element = record.createElement('probe')
+    writer = io.StringIO()
+    textReplacements, attributeReplacements = [], []
+    for character in SPECIAL_CHARACTERS:
+        writer.seek(0)
+        writer.truncate()
+        record.createTextNode(character).writexml(writer)
+        if writer.getvalue() != character:
+            textReplacements.append((character, writer.getvalue()))
+
+        element.setAttribute('a', character)
+        attribute = element.toxml()
+        escaped = attribute[attribute.index('"') + 1:attribute.rindex('"')]
+        if escaped != character:
+            attributeReplacements.append((character, escaped))
+    return makeEscape(textReplacements), makeEscape(attributeReplacements)
+
+
+def makeEscape(replacements):
+    # '&' has to be replaced first so the other entities are not escaped twice
+    replacements.sort(key=lambda replacement: replacement[0] != '&')
+
+    def escape(value):
+        for character, escaped in replacements:
+            if character in value:
+                value = value.replace(character, escaped)
+        return value
+    return escape
+
+
+RENDERERS = {
+    'minidom': MinidomRenderer,
+    'fragments': FragmentRenderer,
+}
@@ -0,0 +1,117 @@
+# coding=utf-8
+
+'''
+Reprojection of the West, East, North, South bounding coordinates to WGS84.
+
+A single pyproj Transformer is kept for each source CRS, and the edges of the bounding
+boxes of a whole chunk of rows are transformed as NumPy arrays in one call per CRS. The
+edges are densified first, as the straight edges of a projected box bow outwards in
+lat/lon and the corners alone would leave out part of the dataset.
+'''
+
+import functools
+
+TARGET_CRS = 'EPSG:4326'
+
+# decimal places kept for reprojected coordinates, about 10cm
+PRECISION = 6
+
+# points added along each edge of a box between its corners, as densify_pts in Transformer.transform_bounds
+DENSIFY_POINTS = 21
+
+
+class ReprojectionError(ValueError):
+
+    field = 'bounding box'
+
+
+@functools.lru_cache(maxsize=None)
+def getTransformer(sourceCrs):
+    from pyproj import Transformer
+    return Transformer.from_crs(sourceCrs, TARGET_CRS, always_xy=True)
+
+
+@functools.lru_cache(maxsize=None)
+def isTarget(sourceCrs):
+    # raises a ValueError if pyproj doesn't know the CRS
+    from pyproj import CRS
+    from pyproj.exceptions import CRSError
+    try:
+        return CRS.from_user_input(sourceCrs) == CRS.from_user_input(TARGET_CRS)
+    except CRSError as e:
+        raise ReprojectionError("bounding box CRS %r is not recognised: %s" % (sourceCrs, e))
+
+
+def checkCrs(sourceCrs):
+    isTarget(sourceCrs)
+
+
+def reprojectBoxes(boxes, sourceCrs):
+    # boxes is an array of (west, east, north, south) rows, returns them as WGS84 strings in the same order,
+    # with None for each box that doesn't have a position in WGS84
+    import numpy
+
+    west, east, north, south = boxes.T
+    steps = numpy.linspace(0, 1, DENSIFY_POINTS + 2)[:, numpy.newaxis]
+    alongX = west + (east - west) * steps
+    alongY = south + (north - south) * steps
+    xs = numpy.concatenate([alongX, alongX, numpy.broadcast_to(west, alongY.shape), numpy.broadcast_to(east, alongY.shape)])
+    ys = numpy.concatenate([numpy.broadcast_to(south, alongX.shape), numpy.broadcast_to(north, alongX.shape), alongY, alongY])
+
+    lons, lats = getTransformer(sourceCrs).transform(xs.ravel(), ys.ravel())
+    lons = numpy.asarray(lons).reshape(xs.shape)
+    lats = numpy.asarray(lats).reshape(ys.shape)
+
+    reprojected = numpy.transpose([lons.min(axis=0), lons.max(axis=0), lats.max(axis=0), lats.min(axis=0)])
+    # pyproj gives inf for points outside the area of the crs, those boxes come back as None
+    finite = numpy.isfinite(reprojected).all(axis=1)
+    # fixed decimals, as gco:Decimal doesn't allow the exponent repr gives small values
+    return [tuple('%.*f' % (PRECISION, value) for value in box) if isFinite else None
+            for box, isFinite in zip(reprojected.tolist(), finite.tolist())]
+
+
+def toArray(boxes):
+    # returns the boxes as an array of floats, or None if any of them isn't numeric
+    import numpy
+    try:
+        return numpy.array(boxes, dtype=float).reshape(-1, 4)
+    except ValueError:
+        return None
+
+
+def reprojectColumn(boxes, crsValues):
+    # reprojects the bounding boxes of a chunk of rows, grouped by their CRS so there is one transform per CRS
+    # returns the boxes in the same order, with a ReprojectionError in place of each one that can't be reprojected
+    # a row without a bounding box still gets a record, so an empty box is passed on as it is
+    result = list(boxes)
+    groups = {}
+    for index, crs in enumerate(crsValues):
+        if crs and any(value.strip() for value in boxes[index]):
+            groups.setdefault(crs, []).append(index)
+
+    for crs, indexes in groups.items():
+        try:
+            if isTarget(crs):
+                continue
+        except ValueError as e:
+            for index in indexes:
+                result[index] = e
+            continue
+
+        numeric = indexes
+        array = toArray([boxes[index] for index in indexes])
+        if array is None:
+            # only look at the boxes one at a time when some of them are bad
+            numeric = []
+            for index in indexes:
+                if toArray([boxes[index]]) is not None:
+                    numeric.append(index)
+                else:
+                    result[index] = ReprojectionError("bounding box %s is not numeric so can't be reprojected from %s" % (','.join(boxes[index]), crs))
+            array = toArray([boxes[index] for index in numeric])
+        if numeric:
+            for index, box in zip(numeric, reprojectBoxes(array, crs)):
+                if box is None:
+                    box = ReprojectionError("bounding box %s is outside the area of %s so can't be reprojected" % (','.join(boxes[index]), crs))
+                result[index] = box
+    return result
@@ -0,0 +1,167 @@
+# coding=utf-8
+
+'''
+Timings and counters for an import run, and the machine-readable report built from them.
+
+Each process keeps a RunStats with the seconds spent in every stage (csv read, row
+preparation, field values, template fill, serialisation and writing), the number of
+records written and the failures grouped by exception type and column. The stats of the
+worker processes are merged into the main process, which writes the report.
+'''
+
+import io
+import sys
+import json
+import time
+import collections
+import contextlib
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak memory is just left out of the report
+    resource = None
+
+# number of entries listed by the profilers
+PROFILE_LIMIT = 20
+
+PROFILERS = ['cprofile', 'tracemalloc']
+
+
+class RunStats:
+
+    def __init__(self):
+        self.seconds = collections.Counter()
+        self.rows = 0
+        self.records = 0
+        self.bytes = 0
+        # records that were built but that GeoNetwork didn't take
+        self.publishFailed = 0
+        self.failures = collections.Counter()
+        # (field, value, suggestion) of the values that aren't in their vocabulary
+        self.problems = collections.Counter()
+        # hits and misses of the fragments backend's cache of rendered blocks
+        self.cache = collections.Counter()
+
+    def time(self, stage, start):
+        # adds the time since start to the stage and returns the current time, so stages can be timed back to back
+        now = time.perf_counter()
+        self.seconds[stage] += now - start
+        return now
+
+    def written(self, size):
+        self.records += 1
+        self.bytes += size
+
+    def failed(self, e):
+        self.failures[(type(e).__name__, failureColumn(e))] += 1
+
+    def unpublished(self, count):
+        # records that couldn't be published were counted as written when they were queued for upload
+        self.records -= count
+        self.publishFailed += count
+        if count:
+            self.failures[('PublishError', 'upload')] += count
+
+    def checked(self, problems):
+        self.problems.update(problems)
+
+    def cached(self, hits, misses):
+        self.cache.update(hits=hits, misses=misses)
+
+    def merge(self, other):
+        self.seconds.update(other.seconds)
+        self.rows += other.rows
+        self.records += other.records
+        self.bytes += other.bytes
+        self.publishFailed += other.publishFailed
+        self.failures.update(other.failures)
+        self.problems.update(other.problems)
+        self.cache.update(other.cache)
+
+    def report(self, elapsed):
+        return {
+            'rows': self.rows,
+            'records': self.records,
+            'failed': sum(self.failures.values()),
+            'publishFailed': self.publishFailed,
+            'outputBytes': self.bytes,
+            'seconds': round(elapsed, 3),
+            'rowsPerSecond': round(self.rows / elapsed, 1) if elapsed else None,
+            'stages': {stage: round(seconds, 3) for stage, seconds in sorted(self.seconds.items())},
+            'peakRssKb': peakRss(),
+            'blockCache': {'hits': self.cache['hits'], 'misses': self.cache['misses'],
+                           'hitRate': round(self.cache['hits'] / sum(self.cache.values()), 3) if sum(self.cache.values()) else None},
+            'failures': [{'type': errorType, 'column': column, 'count': count}
+                         for (errorType, column), count in sorted(self.failures.items())],
+            'vocabularyProblems': [{'field': field, 'value': value, 'suggestion': suggestion, 'count': count}
+                                   for (field, value, suggestion), count in self.problems.most_common()],
+        }
+
+
+def failureColumn(e):
+    # errors from the date and bounding box handling name their column, a short row is just missing columns
+    if getattr(e, 'field', None):
+        return e.field
+    if isinstance(e, IndexError):
+        return 'missing columns'
+    return 'unknown'
+
+
+def timed(rows, stats, stage='read'):
+    # counts the rows and adds the time spent waiting for each of them to the stage
+    rows = iter(rows)
+    while True:
+        start = time.perf_counter()
+        try:
+            row = next(rows)
+        except StopIteration:
+            stats.time(stage, start)
+            return
+        stats.time(stage, start)
+        stats.rows += 1
+        yield row
+
+
+def peakRss():
+    if resource is None:
+        return None
+    # linux reports kilobytes, macos bytes
+    scale = 1024 if sys.platform == 'darwin' else 1
+    return {
+        'main': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+        'workers': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale,
+    }
+
+
+@contextlib.contextmanager
+def profiled(profiler, report):
+    # profiles the main process, adding the busiest functions or the biggest allocations to the report
+    if profiler == 'cprofile':
+        import pstats
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            output = io.StringIO()
+            pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(PROFILE_LIMIT)
+            report['profile'] = output.getvalue().splitlines()
+    elif profiler == 'tracemalloc':
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            report['allocations'] = [str(statistic) for statistic in snapshot.statistics('lineno')[:PROFILE_LIMIT]]
+    else:
+        yield
+
+
+def writeReport(report, path):
+    with open(path, 'w') as reportfile:
+        json.dump(report, reportfile, indent=2)
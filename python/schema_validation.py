@@ -0,0 +1,87 @@
+# coding=utf-8
+
+'''
+Optional validation of the generated records against the ISO 19139 / GEMINI schema.
+
+The XSD (and optionally the GEMINI Schematron rules) are compiled once in each process
+and kept, and each record is validated in memory straight after it is serialised, in
+the same worker process that built it. Valid records are checked while they are parsed,
+in a single pass; only invalid ones are validated again to collect every message. Invalid
+records are written to a quarantine folder with the validator messages next to them.
+'''
+
+import os
+import shutil
+import functools
+
+from output_writers import OUTPUT_DIRECTORY
+
+QUARANTINE_DIRECTORY = os.path.join(OUTPUT_DIRECTORY, 'quarantine')
+
+SVRL_NAMESPACE = 'http://purl.oclc.org/dsdl/svrl'
+
+# the number of validator messages included in error.log, all of them are in the quarantine folder
+LOGGED_MESSAGES = 3
+
+
+class SchemaValidationError(ValueError):
+
+    field = 'schema'
+
+    def __init__(self, messages):
+        message = '; '.join(messages[:LOGGED_MESSAGES])
+        if len(messages) > LOGGED_MESSAGES:
+            message += ' (and %d more)' % (len(messages) - LOGGED_MESSAGES)
+        super().__init__(message)
+        self.messages = messages
+
+
+class RecordValidator:
+
+    def __init__(self, schemaPath, schematronPath=None):
+        from lxml import etree
+        self.etree = etree
+        # schemas are read from local files only, a validation run should never depend on the network
+        self.schema = etree.XMLSchema(etree.parse(schemaPath, etree.XMLParser(no_network=True)))
+        self.validatingParser = etree.XMLParser(schema=self.schema, no_network=True, resolve_entities=False)
+        self.parser = etree.XMLParser(no_network=True, resolve_entities=False)
+        self.schematron = None
+        if schematronPath:
+            from lxml import isoschematron
+            self.schematron = isoschematron.Schematron(etree.parse(schematronPath), store_report=True)
+
+    def validate(self, record):
+        # raises a SchemaValidationError with the validator messages if the record isn't valid
+        etree = self.etree
+        try:
+            doc = etree.fromstring(record, self.validatingParser)
+        except etree.XMLSyntaxError:
+            try:
+                doc = etree.fromstring(record, self.parser)
+            except etree.XMLSyntaxError as e:
+                raise SchemaValidationError(['not well-formed: %s' % e])
+            self.schema.validate(doc)
+            raise SchemaValidationError(['line %d: %s' % (error.line, error.message) for error in self.schema.error_log])
+
+        if self.schematron is not None and not self.schematron.validate(doc):
+            report = self.schematron.validation_report
+            raise SchemaValidationError(['%s (at %s)' % (' '.join(''.join(failure.itertext()).split()), failure.get('location'))
+                                         for failure in report.iterfind('.//{%s}failed-assert' % SVRL_NAMESPACE)])
+
+
+@functools.lru_cache(maxsize=None)
+def loadValidator(schemaPath, schematronPath=None):
+    return RecordValidator(schemaPath, schematronPath)
+
+
+def clearQuarantine():
+    if os.path.exists(QUARANTINE_DIRECTORY):
+        shutil.rmtree(QUARANTINE_DIRECTORY)
+
+
+def quarantine(fileId, record, messages):
+    os.makedirs(QUARANTINE_DIRECTORY, exist_ok=True)
+    with open(os.path.join(QUARANTINE_DIRECTORY, '%s.xml' % fileId), 'wb') as xmlfile:
+        xmlfile.write(record)
+    with open(os.path.join(QUARANTINE_DIRECTORY, '%s.errors.txt' % fileId), 'w') as errorfile:
+        errorfile.write('\n'.join(messages) + '\n')
@@ -0,0 +1,222 @@
+# coding=utf-8
+
+'''
+Compiles the gemini template into a fixed list of slots, so records can be filled in
+without searching the document tree for every row.
+
+A slot records where a value goes (the childNodes index path from the document root),
+how it is inserted and which field of the row it is bound to. The plan is cached next
+to the template and rebuilt whenever the template or the slot definitions change, with
+a separate plan for the template without its whitespace, as the paths are different.
+'''
+
+import os
+import json
+import hashlib
+from collections import namedtuple
+
+from output_writers import replacedFile
+
+# insertion modes
+TEXT = 'text'                    # append a text node to the element
+CODE = 'code'                    # set the codeListValue attribute and append a text node
+ATTRIBUTE = 'attribute'          # set a namespaced attribute on the element
+APPEND = 'append'                # append one child element per item
+INSERT_BEFORE = 'insertBefore'   # insert one child element per item before the element
+
+GML_NAMESPACE = 'http://www.opengis.net/gml/3.2'
+
+# bump this when the format of the cached plan changes
+PLAN_VERSION = 1
+
+# field, insertion mode, element locator and (for attributes) the attribute name
+# each step of a locator is a tag name, optionally followed by the index of the match
+# within the previous step, just like chaining getElementsByTagName calls
+SLOT_DEFINITIONS = [
+    ('fileId', TEXT, 'gmd:fileIdentifier/gco:CharacterString', None),
+    ('fileId', TEXT, 'gmd:identificationInfo/gmd:identifier/gmd:code/gco:CharacterString', None),
+    ('title', TEXT, 'gmd:identificationInfo/gmd:title/gco:CharacterString', None),
+    ('altTitle', TEXT, 'gmd:identificationInfo/gmd:alternateTitle/gco:CharacterString', None),
+    ('creationDate', TEXT, 'gmd:identificationInfo/gmd:CI_Date[0]/gco:Date', None),
+    ('revisionDate', TEXT, 'gmd:identificationInfo/gmd:CI_Date[1]/gco:Date', None),
+    ('abstract', TEXT, 'gmd:identificationInfo/gmd:abstract/gco:CharacterString', None),
+    ('contactName', TEXT, 'gmd:contact/gmd:individualName/gco:CharacterString', None),
+    ('contactOrg', TEXT, 'gmd:contact/gmd:organisationName/gco:CharacterString', None),
+    ('contactPosition', TEXT, 'gmd:contact/gmd:positionName/gco:CharacterString', None),
+    ('contactAddress', TEXT, 'gmd:contact/gmd:deliveryPoint/gco:CharacterString', None),
+    ('contactEmail', TEXT, 'gmd:contact/gmd:electronicMailAddress/gco:CharacterString', None),
+    ('contactName', TEXT, 'gmd:pointOfContact/gmd:individualName/gco:CharacterString', None),
+    ('contactOrg', TEXT, 'gmd:pointOfContact/gmd:organisationName/gco:CharacterString', None),
+    ('contactPosition', TEXT, 'gmd:pointOfContact/gmd:positionName/gco:CharacterString', None),
+    ('contactAddress', TEXT, 'gmd:pointOfContact/gmd:deliveryPoint/gco:CharacterString', None),
+    ('contactEmail', TEXT, 'gmd:pointOfContact/gmd:electronicMailAddress/gco:CharacterString', None),
+    ('updateFrequency', CODE, 'gmd:identificationInfo/gmd:MD_MaintenanceFrequencyCode', None),
+    ('inspireKeywords', INSERT_BEFORE, 'gmd:identificationInfo/gmd:MD_Keywords[0]/gmd:type', None),
+    ('keywords', INSERT_BEFORE, 'gmd:identificationInfo/gmd:MD_Keywords[1]/gmd:type', None),
+    ('useLimitations', APPEND, 'gmd:identificationInfo/gmd:MD_Constraints', None),
+    ('denominator', TEXT, 'gmd:identificationInfo/gmd:denominator/gco:Integer', None),
+    ('topics', APPEND, 'gmd:identificationInfo/gmd:topicCategory', None),
+    ('west', TEXT, 'gmd:EX_GeographicBoundingBox/gmd:westBoundLongitude/gco:Decimal', None),
+    ('east', TEXT, 'gmd:EX_GeographicBoundingBox/gmd:eastBoundLongitude/gco:Decimal', None),
+    ('south', TEXT, 'gmd:EX_GeographicBoundingBox/gmd:southBoundLatitude/gco:Decimal', None),
+    ('north', TEXT, 'gmd:EX_GeographicBoundingBox/gmd:northBoundLatitude/gco:Decimal', None),
+    ('extent', TEXT, 'gmd:EX_GeographicDescription/gmd:code/gco:CharacterString', None),
+    ('gmlId', ATTRIBUTE, 'gml:TimePeriod', 'gml:id'),
+    ('beginDate', TEXT, 'gml:TimePeriod/gml:beginPosition', None),
+    ('endDate', TEXT, 'gml:TimePeriod/gml:endPosition', None),
+    ('distributionFormats', INSERT_BEFORE, 'gmd:MD_Distribution/gmd:transferOptions', None),
+    ('transferURL', TEXT, 'gmd:distributionInfo/gmd:URL', None),
+    ('transferProtocol', TEXT, 'gmd:distributionInfo/gmd:protocol/gco:CharacterString', None),
+    ('dataQuality', CODE, 'gmd:dataQualityInfo/gmd:MD_ScopeCode', None),
+    ('lineage', TEXT, 'gmd:lineage/gmd:statement/gco:CharacterString', None),
+]
+
+Slot = namedtuple('Slot', ['field', 'mode', 'path', 'attribute'])
+
+
+def createKeyword(record, keyword):
+    keywordElement = record.createElement('gmd:keyword')
+    keywordStringElement = record.createElement('gco:CharacterString')
+    keywordStringElement.appendChild(record.createTextNode(keyword))
+    keywordElement.appendChild(keywordStringElement)
+    return keywordElement
+
+
+def createTopic(record, topic):
+    topicElement = record.createElement('gmd:MD_TopicCategoryCode')
+    topicElement.appendChild(record.createTextNode(topic))
+    return topicElement
+
+
+def createUseLimitation(record, useLimitation):
+    useLimitationElement = record.createElement('gmd:useLimitation')
+    useLimitationStringElement = record.createElement('gco:CharacterString')
+    useLimitationStringElement.appendChild(record.createTextNode(useLimitation))
+    useLimitationElement.appendChild(useLimitationStringElement)
+    return useLimitationElement
+
+
+def createDistributionFormat(record, formatVersion):
+    distFormat, version = formatVersion
+    distroFormatElement = record.createElement('gmd:distributionFormat')
+    mdFormatElement = record.createElement('gmd:MD_Format')
+
+    nameElement = record.createElement('gmd:name')
+    nameStringElement = record.createElement('gco:CharacterString')
+    nameStringElement.appendChild(record.createTextNode(distFormat))
+    nameElement.appendChild(nameStringElement)
+    mdFormatElement.appendChild(nameElement)
+
+    versionElement = record.createElement('gmd:version')
+    versionStringElement = record.createElement('gco:CharacterString')
+    versionStringElement.appendChild(record.createTextNode(version))
+    versionElement.appendChild(versionStringElement)
+    mdFormatElement.appendChild(versionElement)
+
+    distroFormatElement.appendChild(mdFormatElement)
+    return distroFormatElement
+
+
+# builds the child element for one item of a repeated field
+ITEM_BUILDERS = {
+    'inspireKeywords': createKeyword,
+    'keywords': createKeyword,
+    'topics': createTopic,
+    'useLimitations': createUseLimitation,
+    'distributionFormats': createDistributionFormat,
+}
+
+# number of values in each item, for the fields whose items are tuples rather than strings
+ITEM_PARTS = {
+    'distributionFormats': 2,
+}
+
+
+def locate(doc, locator):
+    node = doc
+    for step in locator.split('/'):
+        tagName, _, index = step.partition('[')
+        node = node.getElementsByTagName(tagName)[int(index.rstrip(']') or 0)]
+    return node
+
+
+def nodePath(node):
+    # the childNodes index of each ancestor, starting from the document
+    path = []
+    while node.parentNode is not None:
+        path.append(node.parentNode.childNodes.index(node))
+        node = node.parentNode
+    return tuple(reversed(path))
+
+
+def compilePlan(doc):
+    return [Slot(field, mode, nodePath(locate(doc, locator)), attribute)
+            for field, mode, locator, attribute in SLOT_DEFINITIONS]
+
+
+def planKey(templatePath):
+    # identifies both the template and the slot definitions the plan was compiled with
+    with open(templatePath, 'rb') as template:
+        digest = hashlib.sha1(template.read())
+    digest.update(repr((PLAN_VERSION, SLOT_DEFINITIONS)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def stripWhitespace(node):
+    # removes the text nodes that only hold the line breaks and indentation of the template
+    for child in list(node.childNodes):
+        if child.nodeType == child.TEXT_NODE and not child.data.strip():
+            node.removeChild(child)
+        else:
+            stripWhitespace(child)
+    return node
+
+
+def loadPlan(templatePath, doc, stripped=False):
+    # reuse the cached plan unless the template or the slot definitions have changed
+    cachePath = os.path.splitext(templatePath)[0] + ('.stripped' if stripped else '') + '.plan.json'
+    key = planKey(templatePath)
+
+    try:
+        with open(cachePath) as cache:
+            cached = json.load(cache)
+        if cached['key'] == key:
+            return [Slot(field, mode, tuple(path), attribute) for field, mode, path, attribute in cached['slots']]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    plan = compilePlan(doc)
+    with replacedFile(cachePath) as cache:
+        json.dump({'key': key, 'slots': plan}, cache)
+    return plan
+
+
+def resolve(record, path):
+    node = record
+    for index in path:
+        node = node.childNodes[index]
+    return node
+
+
+def fillRecord(record, plan, values):
+    # resolve every slot before inserting anything, as insertions shift the paths of later siblings
+    targets = [resolve(record, slot.path) for slot in plan]
+    for slot, node in zip(plan, targets):
+        value = values[slot.field]
+        if slot.mode == TEXT:
+            node.appendChild(record.createTextNode(value))
+        elif slot.mode == CODE:
+            node.setAttribute('codeListValue', value)
+            node.appendChild(record.createTextNode(value))
+        elif slot.mode == ATTRIBUTE:
+            node.setAttributeNS(GML_NAMESPACE, slot.attribute, value)
+        elif slot.mode == APPEND:
+            createItem = ITEM_BUILDERS[slot.field]
+            for item in value:
+                node.appendChild(createItem(record, item))
+        elif slot.mode == INSERT_BEFORE:
+            createItem = ITEM_BUILDERS[slot.field]
+            parent = node.parentNode
+            for item in value:
+                parent.insertBefore(createItem(record, item), node)
+    return record
@@ -0,0 +1,134 @@
+# coding=utf-8
+
+'''
+Checks on the csv rows that run before any xml is built.
+
+A chunk of rows is checked a column at a time against frozensets of the controlled
+vocabularies listed in the README, looking at each distinct value only once. Rows that
+can't be built (missing columns, no title, bad dates or bounding boxes) are rejected
+straight away, and values that aren't in a vocabulary are collected, with the closest
+match as a suggestion, for a single report at the end of the run.
+'''
+
+import difflib
+import functools
+
+# the number of columns a row needs, the crs column after them is optional
+REQUIRED_COLUMNS = 30
+
+TOPIC_CATEGORIES = frozenset([
+    'farming', 'biota', 'boundaries', 'climatologyMeteorologyAtmosphere', 'economy', 'elevation', 'environment',
+    'geoscientificInformation', 'health', 'imageryBaseMapsEarthCover', 'intelligenceMilitary', 'inlandWaters',
+    'location', 'oceans', 'planningCadastre', 'society', 'structure', 'transportation', 'utilitiesCommunication',
+])
+
+UPDATE_FREQUENCIES = frozenset([
+    'continual', 'daily', 'weekly', 'fortnightly', 'monthly', 'quarterly', 'biannually', 'annually', 'asNeeded',
+    'irregular', 'notPlanned', 'unknown',
+])
+
+DATASET_TYPES = frozenset(['dataset', 'nonGeographicDataset'])
+
+# the english labels of the INSPIRE themes thesaurus
+INSPIRE_THEMES = frozenset([
+    'Addresses', 'Administrative units', 'Agricultural and aquaculture facilities',
+    'Area management/restriction/regulation zones and reporting units', 'Atmospheric conditions',
+    'Bio-geographical regions', 'Buildings', 'Cadastral parcels', 'Coordinate reference systems', 'Elevation',
+    'Energy resources', 'Environmental monitoring facilities', 'Geographical grid systems', 'Geographical names',
+    'Geology', 'Habitats and biotopes', 'Human health and safety', 'Hydrography', 'Land cover', 'Land use',
+    'Meteorological geographical features', 'Mineral resources', 'Natural risk zones',
+    'Oceanographic geographical features', 'Orthoimagery', 'Population distribution — demography',
+    'Production and industrial facilities', 'Protected sites', 'Sea regions', 'Soil', 'Species distribution',
+    'Statistical units', 'Transport networks', 'Utility and governmental services',
+])
+
+# the formats on the lookups sheet of SampleMetadataImport.xlsx
+DATA_FORMATS = frozenset([
+    'Text', 'ESRI Shapefile', 'Mapinfo MIF/MID', 'Mapinfo TAB', 'KML', 'GML', 'GeoTIFF', 'TIFF', 'ECW', 'JPEG2000',
+    'ZIP', 'PDF', 'PNG', 'JPEG', 'OGC:WMC', 'OGC:OWS Context', 'PostGIS database table',
+])
+
+# (field, column, vocabulary, whether the column is a comma-separated list, whether it can be left empty)
+VOCABULARY_COLUMNS = [
+    ('topic category', 14, TOPIC_CATEGORIES, True, False),
+    ('data format', 21, DATA_FORMATS, True, False),
+    ('dataset type', 25, DATASET_TYPES, False, False),
+    ('update frequency', 27, UPDATE_FREQUENCIES, False, False),
+    # records don't need an INSPIRE theme, the keywords are just left out
+    ('INSPIRE theme', 28, INSPIRE_THEMES, True, True),
+]
+
+# how close a value has to be to a vocabulary entry for it to be suggested
+SUGGESTION_CUTOFF = 0.6
+
+
+class ValidationError(ValueError):
+
+    def __init__(self, problems):
+        # problems is a list of (field, message), the first one is used to group the failures in the run report
+        super().__init__('; '.join(message for field, message in problems))
+        self.field = problems[0][0]
+        self.problems = problems
+
+
+@functools.lru_cache(maxsize=None)
+def suggest(value, field):
+    # the vocabulary entry the value was most likely meant to be, or None
+    vocabulary = next(vocabulary for name, column, vocabulary, isList, optional in VOCABULARY_COLUMNS if name == field)
+    for entry in vocabulary:
+        if entry.lower() == value.lower():
+            return entry
+    matches = difflib.get_close_matches(value, sorted(vocabulary), n=1, cutoff=SUGGESTION_CUTOFF)
+    return matches[0] if matches else None
+
+
+def vocabularyMessage(field, value, suggestion):
+    if not value:
+        return "%s is missing" % field
+    message = "%s %r is not in the vocabulary" % (field, value)
+    if suggestion:
+        message += ", did you mean %r?" % suggestion
+    return message
+
+
+def checkVocabulary(values, field, vocabulary, isList, optional=False):
+    # checks a whole column at once, looking at each distinct value only once
+    # returns a list of (field, value, suggestion) for each value, empty if the value is fine
+    checked = {}
+    for value in set(values):
+        items = [item.strip() for item in value.split(',')] if isList else [value]
+        if optional:
+            # an empty optional column, or an empty entry in its list, is left out of the record rather than missing
+            items = [item for item in items if item.strip()]
+        checked[value] = [(field, item, suggest(item, field)) for item in items if item not in vocabulary]
+    return [checked[value] for value in values]
+
+
+def validateRows(rows, prepared, strict=False):
+    # returns (error, problems) for each row, where error is a ValidationError if the row has to be rejected,
+    # and problems lists the (field, value, suggestion) of each value that isn't in its vocabulary
+    columns = [[] for row in rows]
+    for field, index, vocabulary, isList, optional in VOCABULARY_COLUMNS:
+        values = [data[index] if index < len(data) else '' for data in rows]
+        for problems, found in zip(columns, checkVocabulary(values, field, vocabulary, isList, optional)):
+            problems.extend(found)
+
+    results = []
+    for data, preparedValues, problems in zip(rows, prepared, columns):
+        errors = []
+        # a row too short for the column mapping says how many columns the mapping needed
+        needed = getattr(data, 'needed', REQUIRED_COLUMNS)
+        if len(data) < needed:
+            # a short row is rejected for that alone, its missing values aren't vocabulary problems too
+            results.append((ValidationError([('missing columns', "the row has %d columns, %d are needed" % (len(data), needed))]), []))
+            continue
+        if not data[0].strip():
+            errors.append(('title', "title is missing"))
+        # bad dates and bounding boxes have already been found when the row was prepared
+        for value in preparedValues.values():
+            if isinstance(value, Exception):
+                errors.append((getattr(value, 'field', 'unknown'), str(value)))
+        if strict:
+            errors.extend((field, vocabularyMessage(field, value, suggestion)) for field, value, suggestion in problems)
+        results.append((ValidationError(errors) if errors else None, problems))
+    return results